@@ -1,7 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from db import get_session
-from models.schemas import EventCreate
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db import get_async_session
+from event_bulk import create_events, delete_events, update_events
+from event_import import ImportResponse, import_events, iter_lines
+from event_pages import page_events
+from event_search import search_events
+from event_sync import current_revision, list_changes, user_revision
+from models.schemas import BulkEventsCreate, BulkEventsDelete, BulkEventsUpdate, EventCreate
+from nlp.gazetteer import GAZETTEER
+from datetime import datetime
+from typing import Optional
+import hashlib
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,33 +25,63 @@ except ImportError:
 
 router = APIRouter()
 # Endpoints quản lý sự kiện: liệt kê, tạo, lấy, cập nhật, xóa
+# Các route dùng session async (aiosqlite): truy vấn được await nên không chặn event loop,
+# các request đồng thời chạy chồng I/O với nhau
+
+# ETag cho các route GET: tạo từ revision (xem event_sync) và query string, nên tính được mà
+# không cần đọc các dòng. Revision được đọc TRƯỚC khi truy vấn dữ liệu: nếu có thay đổi xen giữa
+# thì body mới hơn ETag (lần sau trả đủ), không bao giờ cũ hơn ETag (304 cho dữ liệu cũ).
+# Cache-Control: no-cache để trình duyệt luôn hỏi lại bằng If-None-Match.
+def _etag(scope: str, revision: int, request: Request) -> str:
+    query = hashlib.blake2b(request.url.query.encode(), digest_size=6).hexdigest()
+    return f'"{scope}-{revision}-{query}"'
+
+def _not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    # Response 304 nếu client đã có bản ứng với `etag`; nếu không thì gắn header vào response
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    match = request.headers.get("if-none-match")
+    if match and (match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in match.split(","))):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
 
 @router.get("", response_model=dict)
-# Lấy danh sách tất cả sự kiện
-async def list_events(session: Session = Depends(get_session)):
+# Lấy danh sách tất cả sự kiện, theo từng trang: truyền lại `next_cursor` của trang trước
+# vào `cursor` để lấy trang sau; count=true để kèm tổng số sự kiện.
+# from/to: chỉ lấy sự kiện giao với khoảng [from, to) (kể cả sự kiện kéo dài qua hai mốc)
+async def list_events(request: Request, response: Response,
+                      limit: Optional[int] = None, cursor: Optional[str] = None, count: bool = False,
+                      start: Optional[datetime] = Query(None, alias="from"),
+                      end: Optional[datetime] = Query(None, alias="to"),
+                      session: AsyncSession = Depends(get_async_session)):
     try:
         logger.info("GET /events endpoint called")
-        events = session.exec(select(Event)).all()
-        result = {"events": [event.dict() for event in events], "count": len(events)}
-        logger.info(f"Found {len(events)} events")
-        return result
+        not_modified = _not_modified(request, response, _etag("events", await current_revision(session), request))
+        if not_modified:
+            return not_modified
+        return await page_events(session, limit=limit, cursor=cursor, count=count, start=start, end=end,
+                                 headers=response.headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching events: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching events: {str(e)}")
 
 @router.post("", response_model=dict)
 # Tạo sự kiện mới
-async def create_event(event: EventCreate, session: Session = Depends(get_session)):
+async def create_event(event: EventCreate, session: AsyncSession = Depends(get_async_session)):
     try:
         # Kiểm tra user_id có tồn tại không
-        user = session.get(User, event.user_id)
+        user = await session.get(User, event.user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
         e = Event(**event.dict())
         session.add(e)
-        session.commit()
-        session.refresh(e)
+        await session.commit()
+        await session.refresh(e)
+        # Học địa điểm mới của người dùng cho bước trích xuất location
+        GAZETTEER.learn(e.user_id, e.location)
 
         return e.dict()
 
@@ -49,27 +90,136 @@ async def create_event(event: EventCreate, session: Session = Depends(get_sessio
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating event: {str(e)}")
 
+@router.post("/bulk", response_model=dict)
+# Tạo nhiều sự kiện trong một transaction. Trả {"results", "ok", "failed"}; mỗi phần tử của
+# "results" ứng với một sự kiện gửi lên ("index", "ok", "event" hoặc "error")
+async def create_events_bulk(payload: BulkEventsCreate, session: AsyncSession = Depends(get_async_session)):
+    try:
+        return await create_events(session, payload.events)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating events: {str(e)}")
+
+@router.put("/bulk", response_model=dict)
+# Cập nhật nhiều sự kiện (mỗi phần tử có thêm "id") trong một transaction
+async def update_events_bulk(payload: BulkEventsUpdate, session: AsyncSession = Depends(get_async_session)):
+    try:
+        return await update_events(session, payload.events)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating events: {str(e)}")
+
+@router.post("/bulk/delete", response_model=dict)
+# Xóa nhiều sự kiện theo danh sách id trong một transaction
+async def delete_events_bulk(payload: BulkEventsDelete, session: AsyncSession = Depends(get_async_session)):
+    try:
+        return await delete_events(session, payload.ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting events: {str(e)}")
+
+@router.post("/import/{user_id}")
+# Import hàng loạt: mỗi dòng của body là mô tả một sự kiện (text/plain) hoặc một dòng
+# NDJSON ("..." hoặc {"text": "..."}). Kết quả từng dòng được stream về dạng NDJSON
+# ngay khi chunk chứa nó được ghi DB; dòng cuối là {"done": true, "imported", "failed"}.
+async def import_user_events(user_id: int, request: Request, format: str = None, session: AsyncSession = Depends(get_async_session)):
+    user = await session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Trả connection về pool trước khi bắt đầu stream (việc ghi dùng session riêng cho mỗi chunk)
+    await session.close()
+
+    content_type = request.headers.get("content-type", "")
+    ndjson = format == "ndjson" if format else "json" in content_type
+    lines = iter_lines(request.stream(), ndjson)
+
+    async def body():
+        async for row in import_events(user_id, lines):
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    return ImportResponse(body(), media_type="application/x-ndjson")
+
 @router.get("/user/{user_id}", response_model=dict)
-# Lấy các sự kiện theo user id
-async def list_events_by_user(user_id: int, session: Session = Depends(get_session)):
+# Lấy các sự kiện theo user id (phân trang và lọc from/to giống GET /events)
+async def list_events_by_user(user_id: int, request: Request, response: Response,
+                              limit: Optional[int] = None, cursor: Optional[str] = None,
+                              count: bool = False,
+                              start: Optional[datetime] = Query(None, alias="from"),
+                              end: Optional[datetime] = Query(None, alias="to"),
+                              session: AsyncSession = Depends(get_async_session)):
     try:
-        user = session.get(User, user_id)
+        user = await session.get(User, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        events = session.exec(select(Event).where(Event.user_id == user_id)).all()
-        return {"events": [event.dict() for event in events], "count": len(events)}
+        etag = _etag(f"user{user_id}", await user_revision(session, user_id), request)
+        not_modified = _not_modified(request, response, etag)
+        if not_modified:
+            return not_modified
+
+        return await page_events(session, user_id=user_id, limit=limit, cursor=cursor, count=count,
+                                 start=start, end=end, headers=response.headers)
 
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching user events: {str(e)}")
 
+@router.get("/user/{user_id}/search", response_model=dict)
+# Tìm sự kiện của user theo tên/địa điểm (không phân biệt dấu, khớp tiền tố từng từ).
+# Trả {"events"} mới nhất trước, tối đa `limit` sự kiện
+async def search_user_events(user_id: int, q: str = "", limit: Optional[int] = None,
+                             session: AsyncSession = Depends(get_async_session)):
+    try:
+        user = await session.get(User, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        return await search_events(session, user_id, q, limit=limit)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching events: {str(e)}")
+
+@router.get("/user/{user_id}/changes", response_model=dict)
+# Đồng bộ delta: sự kiện được tạo/sửa ("events") và bị xóa ("deleted") sau cursor `since`.
+# Gọi lại với since=cursor cho tới khi has_more=false; không có since: chỉ trả cursor hiện tại
+async def list_user_event_changes(user_id: int, since: Optional[int] = None, limit: Optional[int] = None,
+                                  session: AsyncSession = Depends(get_async_session)):
+    try:
+        user = await session.get(User, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        return await list_changes(session, user_id, since=since, limit=limit)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching event changes: {str(e)}")
+
 @router.get("/{event_id}", response_model=dict)
 # Lấy chi tiết một sự kiện theo id
-async def get_event(event_id: int, session: Session = Depends(get_session)):
+async def get_event(event_id: int, request: Request, response: Response,
+                    session: AsyncSession = Depends(get_async_session)):
     try:
-        event = session.get(Event, event_id)
+        # Chỉ đọc revision (một lần dò khóa chính) để so với If-None-Match
+        row = (await session.exec(select(Event.id, Event.revision).where(Event.id == event_id))).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        not_modified = _not_modified(request, response, _etag(f"event{event_id}", row.revision, request))
+        if not_modified:
+            return not_modified
+
+        event = await session.get(Event, event_id)
         if not event:
             raise HTTPException(status_code=404, detail="Event not found")
         return event.dict()
@@ -80,14 +230,14 @@ async def get_event(event_id: int, session: Session = Depends(get_session)):
 
 @router.put("/{event_id}", response_model=dict)
 # Cập nhật sự kiện theo id
-async def update_event(event_id: int, event: EventCreate, session: Session = Depends(get_session)):
+async def update_event(event_id: int, event: EventCreate, session: AsyncSession = Depends(get_async_session)):
     try:
-        existing = session.get(Event, event_id)
+        existing = await session.get(Event, event_id)
         if not existing:
             raise HTTPException(status_code=404, detail="Event not found")
 
         # Kiểm tra user tồn tại
-        user = session.get(User, event.user_id)
+        user = await session.get(User, event.user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -100,8 +250,9 @@ async def update_event(event_id: int, event: EventCreate, session: Session = Dep
         existing.time_reminder = event.time_reminder
 
         session.add(existing)
-        session.commit()
-        session.refresh(existing)
+        await session.commit()
+        await session.refresh(existing)
+        GAZETTEER.learn(existing.user_id, existing.location)
 
         return existing.dict()
 
@@ -112,15 +263,15 @@ async def update_event(event_id: int, event: EventCreate, session: Session = Dep
 
 @router.delete("/{event_id}", response_model=dict)
 # Xóa sự kiện theo id
-async def delete_event(event_id: int, session: Session = Depends(get_session)):
+async def delete_event(event_id: int, session: AsyncSession = Depends(get_async_session)):
     """Delete an event by id"""
     try:
-        existing = session.get(Event, event_id)
+        existing = await session.get(Event, event_id)
         if not existing:
             raise HTTPException(status_code=404, detail="Event not found")
 
-        session.delete(existing)
-        session.commit()
+        await session.delete(existing)
+        await session.commit()
 
         return {"ok": True, "message": "Event deleted"}
 
@@ -1,30 +1,174 @@
+from typing import Optional
 from fastapi import APIRouter, HTTPException
-from nlp_processor import NLPProcessor
-from models.schemas import TextRequest
+from nlp.fallback import FALLBACK
+from nlp.gazetteer import GAZETTEER
+from nlp.patterns import REGISTRY
+from nlp.session import SessionStore
+from nlp.timing import TIMINGS
+from nlp_pool import (NLP_BATCH_MAX, PoolSaturated, get_processor, pool_stats, process_batch, process_one,
+                      process_preview)
+from models.schemas import BatchTextRequest, IncrementalTextRequest, TextRequest
 
 router = APIRouter()
-processor = NLPProcessor()
+# Cùng processor (và cache) với batch/import chạy trên thread pool
+processor = get_processor()
+# Phiên parse khi đang gõ (/nlp/parse/incremental)
+sessions = SessionStore()
 
 # Endpoint NLP: parse text and extract event fields
+# Việc parse chạy trên worker pool (xem nlp_pool.py) để không chặn event loop;
+# khi hàng đợi đầy trả 503 để client thử lại sau.
+
+
+def _saturated(e: PoolSaturated) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
+def _to_response(result: dict) -> dict:
+    # Trả về chỉ các field cần thiết
+    return {
+        "event_name": result.get("event_name"),
+        "start_time": result.get("start_time"),
+        "end_time": result.get("end_time"),
+        "location": result.get("location"),
+        "time_reminder": result.get("time_reminder"),
+        # Độ tin cậy (0..1) của pipeline regex và bộ parse đã cho ra thời điểm (regex/dateparser)
+        "confidence": result.get("confidence"),
+        "parser": result.get("parser"),
+    }
 
 @router.post("/parse")
-async def parse_text(request: TextRequest):
+async def parse_text(request: TextRequest, trace: bool = False):
     # Nhận text tiếng Việt và trả về JSON với các field:
     #event_name, start_time, end_time, location, time_reminder
+    # ?trace=1: trả thêm thời gian từng bước và các span đã khớp (không dùng cache)
     if not request.text.strip():
         raise HTTPException(status_code=400, detail="Missing text")
     
     try:
-        result = processor.process_text(request.text)
-        
-        # Trả về chỉ các field cần thiết
-        response = {
-            "event_name": result.get("event_name"),
-            "start_time": result.get("start_time"),
-            "end_time": result.get("end_time"),
-            "location": result.get("location"),
-            "time_reminder": result.get("time_reminder")
-        }
+        result = await process_one(processor, request.text, trace=trace, user_id=request.user_id)
+        response = _to_response(result)
+        if trace:
+            response["trace"] = result.get("trace")
+            response["error"] = result.get("error")
         return response
+    except PoolSaturated as e:
+        raise _saturated(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing text: {str(e)}")
+
+
+@router.post("/parse/batch")
+async def parse_batch(request: BatchTextRequest):
+    # Nhận danh sách text (vd. từng dòng của log chat / biên bản họp) và trả về
+    # kết quả theo đúng thứ tự. Việc parse chạy trên process pool (xem nlp_pool.py).
+    if len(request.texts) > NLP_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Too many texts (max {NLP_BATCH_MAX})")
+
+    # Dòng rỗng không gửi sang worker, trả lỗi tại chỗ
+    indexes = [i for i, text in enumerate(request.texts) if text.strip()]
+    try:
+        parsed = await process_batch([request.texts[i] for i in indexes], user_id=request.user_id)
+    except PoolSaturated as e:
+        raise _saturated(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing texts: {str(e)}")
+
+    results = [dict(_to_response({}), error="Missing text") for _ in request.texts]
+    for i, result in zip(indexes, parsed):
+        item = _to_response(result)
+        item["error"] = result.get("error")
+        results[i] = item
+    return {"results": results, "count": len(results)}
+
+
+@router.post("/parse/incremental")
+async def parse_incremental(request: IncrementalTextRequest):
+    # Parse khi đang gõ: client giữ `session` trả về và chỉ gửi phần gõ thêm (`append`,
+    # kèm `delete` khi xóa ở cuối) hoặc gửi lại toàn bộ `text` khi sửa ở giữa.
+    # Server dùng lại phần chuẩn hóa và span của lần trước, chỉ xử lý lại phần đuôi.
+    session = sessions.get(request.session) if request.session else None
+    if session is None:
+        if request.session and request.text is None:
+            # Phiên đã hết hạn: client cần gửi lại toàn bộ văn bản
+            raise HTTPException(status_code=404, detail="Session expired, resend full text")
+        session = sessions.create(request.user_id)
+
+    try:
+        result = await process_preview(processor, session, request.text, request.append, max(0, request.delete))
+    except PoolSaturated as e:
+        raise _saturated(e)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing text: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error processing text: {str(e)}")
+
+    response = _to_response(result) if session.text.strip() else _to_response({})
+    response["session"] = session.token
+    response["length"] = len(session.text)
+    response["error"] = result.get("error")
+    return response
+
+
+@router.delete("/parse/incremental/{token}")
+async def end_incremental(token: str):
+    # Đóng phiên khi người dùng đã gửi/hủy (phiên không đóng sẽ hết hạn sau NLP_SESSION_TTL)
+    return {"closed": sessions.drop(token)}
+
+
+@router.get("/sessions/stats")
+async def session_stats():
+    # Số phiên parse-khi-gõ đang mở, đã tạo, hết hạn và bị đẩy ra
+    return sessions.stats()
+
+
+@router.get("/patterns/stats")
+async def pattern_stats(top: Optional[int] = None, reset: bool = False):
+    # Thống kê số lần gọi/khớp và thời gian của từng regex trong package nlp.
+    # Chỉ có số liệu khi bật NLP_PATTERN_STATS=1 (hoặc REGISTRY.enable_stats()).
+    result = {
+        "enabled": REGISTRY.stats_enabled,
+        "pattern_count": len(REGISTRY),
+        "patterns": REGISTRY.stats(top),
+    }
+    if reset:
+        REGISTRY.reset_stats()
+    return result
+
+
+@router.get("/cache/stats")
+async def cache_stats(reset: bool = False, clear: bool = False):
+    # Số lần hit/miss của cache kết quả parse (của processor dùng cho /nlp/parse)
+    result = processor.cache.stats()
+    if reset:
+        processor.cache.reset_stats()
+    if clear:
+        processor.cache.clear()
+    return result
+
+
+@router.get("/pool/stats")
+async def nlp_pool_stats():
+    # Trạng thái worker pool: số request đang chờ/chạy và số request bị từ chối (503)
+    return pool_stats()
+
+
+@router.get("/timing/stats")
+async def timing_stats(reset: bool = False):
+    # p50/p95/p99 thời gian từng bước của NLPProcessor trên cửa sổ các lần parse gần nhất.
+    # Chỉ có số liệu khi bật NLP_TIMING=1 (các worker process của batch đo riêng, không gộp ở đây).
+    result = TIMINGS.stats()
+    if reset:
+        TIMINGS.reset()
+    return result
+
+
+@router.get("/fallback/stats")
+async def fallback_stats():
+    # Trạng thái tầng dateparser: bật/tắt, đã import chưa, số lần gọi và số lần tìm được ngày
+    # (chỉ của process này; worker process của batch đếm riêng)
+    return FALLBACK.stats()
+
+
+@router.get("/gazetteer/stats")
+async def gazetteer_stats():
+    # Số địa điểm chung (file dữ liệu), số người dùng và số location đã học, số location/người dùng bị bỏ
+    return GAZETTEER.stats()
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 from db import get_session
 from models.schemas import UserCreate
@@ -8,6 +9,7 @@ from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta
 import hashlib
+import orjson
 
 try:
     from models import User
@@ -50,24 +52,6 @@ def add_cors_headers(response, request: Request = None):
 def create_user(user: UserCreate, session: Session = Depends(get_session), request: Request = None):
     """Tạo user mới. Mật khẩu được băm trước khi lưu."""
     try:
-        # Kiểm tra username đã tồn tại chưa
-        existing_user = session.exec(select(User).where(User.username == user.username)).first()
-        if existing_user:
-            response = JSONResponse(
-                status_code=400,
-                content={"detail": "Username already exists"}
-            )
-            return add_cors_headers(response, request)
-
-        # Kiểm tra email đã tồn tại chưa
-        existing_email = session.exec(select(User).where(User.email == user.email)).first()
-        if existing_email:
-            response = JSONResponse(
-                status_code=400,
-                content={"detail": "Email already exists"}
-            )
-            return add_cors_headers(response, request)
-
         # Luôn pre-hash bằng SHA-256 trước khi đưa cho bcrypt để tránh giới hạn 72 bytes
         # Lưu bcrypt(pre_hashed) và so sánh khi đăng nhập.
         if not getattr(user, "password", None):
@@ -88,9 +72,17 @@ def create_user(user: UserCreate, session: Session = Depends(get_session), reque
             response = JSONResponse(status_code=400, content={"detail": f"Invalid password: {str(e)}"})
             return add_cors_headers(response, request)
         
+        # Username/email trùng được phát hiện bởi ràng buộc UNIQUE khi ghi (một lần dò index),
+        # thay vì truy vấn kiểm tra trước cho từng trường
         u = User(username=user.username, email=user.email, password_hash=hashed)
         session.add(u)
-        session.commit()
+        try:
+            session.commit()
+        except IntegrityError as e:
+            session.rollback()
+            field = "Email" if "email" in str(e.orig) else "Username"
+            response = JSONResponse(status_code=400, content={"detail": f"{field} already exists"})
+            return add_cors_headers(response, request)
         session.refresh(u)
 
         # Không trả password hash cho client
@@ -203,11 +195,12 @@ def login(payload: LoginRequest, session: Session = Depends(get_session), reques
 # Liệt kê người dùng (đã lọc dữ liệu nhạy cảm)
 def list_users(session: Session = Depends(get_session), request: Request = None):
     try:
-        users = session.exec(select(User)).all()
-        # Trả về danh sách user đã loại bỏ thông tin nhạy cảm
-        response = JSONResponse(
-            status_code=200,
-            content=[{"id": u.id, "username": u.username, "email": u.email} for u in users]
+        # Chỉ đọc các cột trả về (không tải password hash, không dựng object ORM);
+        # mã hóa JSON bằng orjson
+        rows = session.exec(select(User.id, User.username, User.email)).all()
+        response = Response(
+            content=orjson.dumps([{"id": user_id, "username": username, "email": email} for user_id, username, email in rows]),
+            media_type="application/json",
         )
         return add_cors_headers(response, request)
     except Exception as e:
@@ -1,19 +1,115 @@
+import os
 from pathlib import Path
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import Session, create_engine, SQLModel
-from typing import Generator
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Any, AsyncGenerator, Dict, Generator, Optional
+
+from migrations import run_migrations
 
 # Tạo URL SQLite phù hợp cho Windows và các hệ điều hành khác
 BASE_DIR = Path(__file__).parent
 DB_FILE = BASE_DIR / "database.db"
 DATABASE_URL = f"sqlite:///{DB_FILE.as_posix()}"
+# Cùng file database, qua driver aiosqlite cho các route async
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_FILE.as_posix()}"
+
+# ======= CẤU HÌNH SQLITE =======
+# DB_PROFILE chọn bộ thiết lập cho engine: dev (mặc định), prod hoặc bench.
+# DB_ECHO=1 in mọi câu SQL ra stdout (chỉ nên bật khi debug).
+DB_PROFILE = os.getenv("DB_PROFILE", "dev")
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+
+# - journal_mode WAL: người đọc không bị chặn bởi người ghi (và ngược lại)
+# - busy_timeout (ms): chờ khóa thay vì lỗi "database is locked" ngay lập tức
+# - synchronous: NORMAL an toàn với WAL (chỉ có thể mất transaction cuối khi mất điện);
+#   OFF chỉ dùng cho benchmark
+# - cache_size: số âm là KiB; mmap_size: số byte đọc qua memory-map (0 = tắt)
+# - pool_size/max_overflow: số connection giữ sẵn / được mở thêm khi tải cao
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "dev": {
+        "journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000,
+        "cache_size": -16000, "mmap_size": 0, "pool_size": 5, "max_overflow": 10,
+    },
+    "prod": {
+        "journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 10000,
+        "cache_size": -64000, "mmap_size": 256 * 1024 * 1024, "pool_size": 10, "max_overflow": 20,
+    },
+    "bench": {
+        "journal_mode": "WAL", "synchronous": "OFF", "busy_timeout": 10000,
+        "cache_size": -64000, "mmap_size": 256 * 1024 * 1024, "pool_size": 20, "max_overflow": 20,
+    },
+}
+PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size")
+
+
+def _profile_settings(profile: str) -> Dict[str, Any]:
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r} (expected one of {', '.join(PROFILES)})")
+    return PROFILES[profile]
+
+
+def _set_pragmas_on_connect(engine: Engine, settings: Dict[str, Any]) -> None:
+    # Các PRAGMA được đặt cho mỗi connection mới mở
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name in PRAGMAS:
+            cursor.execute(f"PRAGMA {name}={settings[name]}")
+        cursor.close()
 
-engine = create_engine(DATABASE_URL, echo=True)
+
+def make_engine(url: str = DATABASE_URL, profile: str = DB_PROFILE, echo: Optional[bool] = None) -> Engine:
+    # Engine SQLite theo profile
+    settings = _profile_settings(profile)
+    engine = create_engine(
+        url,
+        echo=DB_ECHO if echo is None else echo,
+        pool_size=settings["pool_size"],
+        max_overflow=settings["max_overflow"],
+        # Connection được trả về pool rồi dùng ở thread khác (threadpool của FastAPI)
+        connect_args={"check_same_thread": False},
+    )
+    _set_pragmas_on_connect(engine, settings)
+    return engine
+
+
+def make_async_engine(url: str = ASYNC_DATABASE_URL, profile: str = DB_PROFILE,
+                      echo: Optional[bool] = None) -> AsyncEngine:
+    # Engine async (aiosqlite) với cùng profile: mỗi connection chạy trong một thread riêng
+    # của aiosqlite nên truy vấn không chặn event loop, và các request đồng thời dùng
+    # các connection khác nhau trong pool (đọc song song nhờ WAL)
+    settings = _profile_settings(profile)
+    engine = create_async_engine(
+        url,
+        echo=DB_ECHO if echo is None else echo,
+        pool_size=settings["pool_size"],
+        max_overflow=settings["max_overflow"],
+    )
+    _set_pragmas_on_connect(engine.sync_engine, settings)
+    return engine
+
+
+engine = make_engine()
+async_engine = make_async_engine()
 
 def init_db():
     #Khởi tạo các bảng trong database.
     SQLModel.metadata.create_all(engine)
+    # Áp dụng các thay đổi schema (index, ràng buộc...) còn thiếu cho database đã có
+    applied = run_migrations(engine)
+    if applied:
+        print(f"[db] Đã chạy migration {applied}")
 
 def get_session() -> Generator[Session, None, None]:
     # Trả về Context-managed session để sử dụng trong các route
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    # Session async cho các route `async def`: mọi truy vấn phải được `await`.
+    # expire_on_commit=False: đọc thuộc tính sau commit không phát sinh truy vấn ngầm (không
+    # được phép ngoài await)
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
@@ -0,0 +1,139 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import delete, insert, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Event, User
+from models.schemas import EventCreate, EventUpdate
+from nlp.gazetteer import GAZETTEER
+
+# ======= THAO TÁC HÀNG LOẠT TRÊN SỰ KIỆN =======
+# Tạo/sửa/xóa nhiều sự kiện trong một request: kiểm tra mọi user được tham chiếu bằng một
+# truy vấn, ghi tất cả bằng một câu lệnh nhiều dòng (executemany) trong một transaction
+# (một lần commit/fsync). Kết quả trả về theo từng phần tử: phần tử lỗi (user/sự kiện không
+# tồn tại...) bị bỏ qua, các phần tử còn lại vẫn được ghi.
+
+# Số phần tử tối đa trong một request
+EVENTS_BULK_MAX = int(os.getenv("EVENTS_BULK_MAX", "1000"))
+
+# Các trường của sự kiện được ghi khi tạo/sửa (giống create_event/update_event)
+FIELDS = ("user_id", "event_name", "start_time", "end_time", "location", "time_reminder")
+
+
+def _check_size(items: List[Any]) -> None:
+    # ValueError nếu request quá lớn
+    if len(items) > EVENTS_BULK_MAX:
+        raise ValueError(f"Too many items ({len(items)} > {EVENTS_BULK_MAX})")
+
+
+async def _existing_users(session: AsyncSession, events: Iterable[EventCreate]) -> Set[int]:
+    user_ids = {event.user_id for event in events}
+    if not user_ids:
+        return set()
+    return set((await session.exec(select(User.id).where(User.id.in_(user_ids)))).all())
+
+
+def _item_error(event: EventCreate, users: Set[int]) -> Optional[str]:
+    if event.user_id not in users:
+        return "User not found"
+    if event.start_time is None:
+        return "start_time is required"
+    return None
+
+
+async def _revisions(session: AsyncSession, ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    # revision/updated_at do trigger đồng bộ (migration "event_sync") ghi, đọc lại trong cùng transaction
+    statement = select(Event.id, Event.revision, Event.updated_at).where(Event.id.in_(set(ids)))
+    return {row.id: {"revision": row.revision, "updated_at": row.updated_at}
+            for row in (await session.exec(statement)).all()}
+
+
+def _summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = sum(1 for row in results if row["ok"])
+    return {"results": results, "ok": ok, "failed": len(results) - ok}
+
+
+async def create_events(session: AsyncSession, events: List[EventCreate]) -> Dict[str, Any]:
+    _check_size(events)
+    users = await _existing_users(session, events)
+    results: List[Dict[str, Any]] = []
+    created: List[Event] = []
+    for index, item in enumerate(events):
+        error = _item_error(item, users)
+        if error:
+            results.append({"index": index, "ok": False, "error": error})
+            continue
+        # Dựng Event để áp dụng giá trị mặc định (created_at, reminder_sent...)
+        event = Event(**item.dict())
+        created.append(event)
+        results.append({"index": index, "ok": True, "event": event})
+
+    if created:
+        # Một câu INSERT nhiều dòng; id trả về theo đúng thứ tự các dòng
+        statement = insert(Event).returning(Event.id, sort_by_parameter_order=True)
+        rows = [event.dict(exclude={"id"}) for event in created]
+        ids = (await session.exec(statement, params=rows)).scalars().all()
+        for event, event_id in zip(created, ids):
+            event.id = event_id
+        synced = await _revisions(session, ids)
+        for event in created:
+            event.revision = synced[event.id]["revision"]
+            event.updated_at = synced[event.id]["updated_at"]
+        await session.commit()
+        GAZETTEER.learn_many((event.user_id, event.location) for event in created)
+
+    for row in results:
+        if row["ok"]:
+            row["event"] = row["event"].dict()
+    return _summary(results)
+
+
+async def update_events(session: AsyncSession, events: List[EventUpdate]) -> Dict[str, Any]:
+    _check_size(events)
+    users = await _existing_users(session, events)
+    ids = {event.id for event in events}
+    existing = {
+        event.id: event.dict()
+        for event in (await session.exec(select(Event).where(Event.id.in_(ids)))).all()
+    } if ids else {}
+
+    results: List[Dict[str, Any]] = []
+    values: Dict[int, Dict[str, Any]] = {}
+    for index, item in enumerate(events):
+        error = "Event not found" if item.id not in existing else _item_error(item, users)
+        if error:
+            results.append({"index": index, "ok": False, "error": error})
+            continue
+        # Cùng một id xuất hiện nhiều lần: phần tử sau cùng được ghi
+        values[item.id] = {"id": item.id, **{field: getattr(item, field) for field in FIELDS}}
+        results.append({"index": index, "ok": True, "id": item.id})
+
+    if values:
+        # UPDATE theo khóa chính cho từng dòng, chạy bằng executemany
+        await session.exec(update(Event), params=list(values.values()))
+        synced = await _revisions(session, values)
+        await session.commit()
+        GAZETTEER.learn_many((row["user_id"], row["location"]) for row in values.values())
+
+    for row in results:
+        if row["ok"]:
+            event_id = row.pop("id")
+            row["event"] = {**existing[event_id], **values[event_id], **synced[event_id]}
+    return _summary(results)
+
+
+async def delete_events(session: AsyncSession, ids: List[int]) -> Dict[str, Any]:
+    _check_size(ids)
+    deleted: Set[int] = set()
+    if ids:
+        statement = delete(Event).where(Event.id.in_(set(ids))).returning(Event.id)
+        deleted = set((await session.exec(statement)).scalars().all())
+        await session.commit()
+    results = [
+        {"index": index, "ok": True, "id": event_id} if event_id in deleted
+        else {"index": index, "ok": False, "id": event_id, "error": "Event not found"}
+        for index, event_id in enumerate(ids)
+    ]
+    return _summary(results)
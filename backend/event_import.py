@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select
+
+from db import engine
+from models import Event
+from nlp.gazetteer import GAZETTEER
+from nlp_pool import PoolSaturated, process_batch
+
+# ======= CẤU HÌNH IMPORT HÀNG LOẠT =======
+# Số dòng được parse và ghi vào DB trong một transaction
+EVENTS_IMPORT_CHUNK = int(os.getenv("EVENTS_IMPORT_CHUNK", "500"))
+# Số chunk đã parse xong được giữ chờ ghi DB; giới hạn bộ nhớ dù file lớn tới đâu
+EVENTS_IMPORT_PREFETCH = int(os.getenv("EVENTS_IMPORT_PREFETCH", "2"))
+# Độ dài tối đa một dòng (byte); dòng dài hơn bị bỏ qua và báo lỗi
+EVENTS_IMPORT_MAX_LINE = int(os.getenv("EVENTS_IMPORT_MAX_LINE", "4096"))
+
+# (số dòng, văn bản hoặc None, lỗi nếu không đọc được dòng)
+Line = Tuple[int, Optional[str], Optional[str]]
+
+
+class ImportResponse(StreamingResponse):
+    # Body của request được đọc dần trong lúc kết quả đang được stream về. StreamingResponse
+    # mặc định chạy song song một task chờ client ngắt kết nối, task đó cũng gọi receive()
+    # và sẽ "nuốt" các phần body chưa đọc; ở đây việc đọc body đã tự phát hiện ngắt kết nối.
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _decode_line(raw: bytes, ndjson: bool) -> Tuple[Optional[str], Optional[str]]:
+    # Trả về (văn bản, lỗi). NDJSON: mỗi dòng là chuỗi JSON hoặc object có khóa "text"
+    try:
+        line = raw.decode("utf-8").strip()
+    except UnicodeDecodeError:
+        return None, "Invalid UTF-8"
+    if not ndjson:
+        return line, None
+    if not line:
+        return "", None
+    try:
+        value = json.loads(line)
+    except ValueError:
+        return None, "Invalid JSON"
+    if isinstance(value, dict):
+        value = value.get("text")
+    if not isinstance(value, str):
+        return None, 'Expected a string or an object with "text"'
+    return value.strip(), None
+
+
+async def iter_lines(stream: AsyncIterator[bytes], ndjson: bool) -> AsyncIterator[Line]:
+    # Tách luồng byte thành từng dòng mà không đọc cả file vào bộ nhớ. Dòng trống được bỏ qua
+    # (vẫn được đếm để số dòng trong kết quả khớp với file).
+    too_long = f"Line longer than {EVENTS_IMPORT_MAX_LINE} bytes"
+    buffer = b""
+    line_no = 0
+    overflow = False
+    async for chunk in stream:
+        *complete, buffer = (buffer + chunk).split(b"\n")
+        for raw in complete:
+            line_no += 1
+            if overflow or len(raw) > EVENTS_IMPORT_MAX_LINE:
+                overflow = False
+                yield line_no, None, too_long
+                continue
+            text, error = _decode_line(raw, ndjson)
+            if text or error:
+                yield line_no, text, error
+        if len(buffer) > EVENTS_IMPORT_MAX_LINE:
+            # Dòng quá dài: bỏ phần đã đọc, báo lỗi khi gặp cuối dòng
+            overflow = True
+            buffer = b""
+    if overflow:
+        yield line_no + 1, None, too_long
+    elif buffer.strip():
+        text, error = _decode_line(buffer, ndjson)
+        yield line_no + 1, text, error
+
+
+async def _parse_chunk(texts: List[str], now: datetime, user_id: int) -> List[Dict[str, Any]]:
+    # Parse trên worker pool; khi hàng đợi NLP đầy thì chờ rồi thử lại thay vì bỏ cả lần import
+    while True:
+        try:
+            return await process_batch(texts, now, user_id)
+        except PoolSaturated:
+            await asyncio.sleep(0.05)
+
+
+def _to_event(user_id: int, result: Dict[str, Any]) -> Event:
+    return Event(
+        user_id=user_id,
+        event_name=result["event_name"],
+        start_time=datetime.fromisoformat(result["start_time"]),
+        end_time=datetime.fromisoformat(result["end_time"]) if result.get("end_time") else None,
+        location=result.get("location"),
+        time_reminder=result.get("time_reminder"),
+    )
+
+
+def _insert_chunk(user_id: int, parsed: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    # Ghi các dòng parse thành công trong một transaction; trả về kết quả theo từng dòng
+    rows: List[Dict[str, Any]] = []
+    events: List[Tuple[Dict[str, Any], Event]] = []
+    for line_no, result in parsed:
+        if result.get("error") or not result.get("start_time"):
+            rows.append({"line": line_no, "ok": False, "error": result.get("error") or "Could not parse"})
+            continue
+        row = {"line": line_no, "ok": True, "event": None}
+        rows.append(row)
+        events.append((row, _to_event(user_id, result)))
+
+    if events:
+        with Session(engine) as session:
+            session.add_all([event for _, event in events])
+            # flush để có id trước khi commit (sau commit các thuộc tính bị expire)
+            session.flush()
+            # revision/updated_at do trigger đồng bộ (migration "event_sync") ghi, đọc lại trong cùng transaction
+            statement = select(Event.id, Event.revision, Event.updated_at).where(
+                Event.id.in_([event.id for _, event in events])
+            )
+            synced = {row.id: {"revision": row.revision, "updated_at": row.updated_at}
+                      for row in session.exec(statement).all()}
+            for row, event in events:
+                # Không gán vào event: sẽ thành một UPDATE lúc commit (và tăng revision thêm lần nữa)
+                row["event"] = jsonable_encoder({**event.dict(), **synced[event.id]})
+            session.commit()
+        GAZETTEER.learn_many((user_id, row["event"]["location"]) for row, _ in events)
+    return rows
+
+
+async def import_events(user_id: int, lines: AsyncIterator[Line]) -> AsyncIterator[Dict[str, Any]]:
+    # Pipeline 3 bước chạy chồng lên nhau: đọc + parse chunk sau trong lúc chunk trước đang
+    # được ghi DB. Hàng đợi giữa hai bước có giới hạn nên bộ nhớ không tăng theo kích thước file.
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, EVENTS_IMPORT_PREFETCH))
+    # Mọi dòng của một lần import dùng chung thời điểm tham chiếu ('mai', 'thứ 6'...)
+    now = datetime.now()
+
+    async def produce():
+        pending: List[Line] = []
+
+        async def flush():
+            texts = [text for _, text, error in pending if error is None]
+            parsed = iter(await _parse_chunk(texts, now, user_id)) if texts else iter(())
+            chunk = [
+                (line_no, {"error": error} if error is not None else next(parsed))
+                for line_no, text, error in pending
+            ]
+            await queue.put(chunk)
+            pending.clear()
+
+        try:
+            async for line in lines:
+                pending.append(line)
+                if len(pending) >= EVENTS_IMPORT_CHUNK:
+                    await flush()
+            if pending:
+                await flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Lỗi khi đọc/parse (vd. client ngắt kết nối): chuyển cho bên ghi DB ném lại
+            await queue.put(e)
+            return
+        await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    loop = asyncio.get_running_loop()
+    imported = failed = 0
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            rows = await loop.run_in_executor(None, _insert_chunk, user_id, chunk)
+            for row in rows:
+                if row["ok"]:
+                    imported += 1
+                else:
+                    failed += 1
+                yield row
+    finally:
+        if not producer.done():
+            producer.cancel()
+    yield {"done": True, "imported": imported, "failed": failed}
@@ -0,0 +1,141 @@
+import base64
+import os
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, List, Mapping, Optional, Tuple
+
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, func, or_, tuple_, union_all
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db import async_engine
+from models import Event
+from models.models import EVENT_SPAN_DAYS
+
+# ======= PHÂN TRANG DANH SÁCH SỰ KIỆN =======
+# Phân trang keyset theo (start_time, id): mỗi trang chỉ đọc các dòng sau dòng cuối của
+# trang trước, nên thời gian lấy một trang không phụ thuộc vào vị trí trang hay kích thước bảng
+# (khác với OFFSET phải bỏ qua toàn bộ các dòng trước đó).
+
+# Số sự kiện mặc định và tối đa trong một trang
+EVENTS_PAGE_SIZE = int(os.getenv("EVENTS_PAGE_SIZE", "100"))
+EVENTS_PAGE_MAX = int(os.getenv("EVENTS_PAGE_MAX", "500"))
+# Số dòng được đọc từ database và mã hóa JSON mỗi lần khi stream một trang: bộ nhớ dùng cho
+# một response tỉ lệ với số này, không phải với số dòng của trang
+EVENTS_STREAM_CHUNK = int(os.getenv("EVENTS_STREAM_CHUNK", "100"))
+# Lọc theo khoảng from/to: sự kiện bắt đầu trước "from" quá số ngày này được coi là sự kiện
+# dài và tìm riêng (xem _long_event_ids)
+EVENTS_RANGE_LOOKBACK_DAYS = int(os.getenv("EVENTS_RANGE_LOOKBACK_DAYS", "31"))
+
+# Trang được đọc dưới dạng tuple các cột (không dựng object ORM rồi .dict() cho từng dòng)
+EVENT_COLUMNS = tuple(Event.__table__.c)
+EVENT_KEYS = tuple(column.name for column in EVENT_COLUMNS)
+
+
+def encode_cursor(event: Any) -> str:
+    # Cursor là vị trí (start_time, id) của dòng cuối trang (Event hoặc dòng kết quả có hai cột
+    # này), mã hóa base64 cho gọn trên URL
+    raw = f"{event.start_time.isoformat()}|{event.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    # ValueError nếu cursor không hợp lệ
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        start, event_id = raw.split("|")
+        return datetime.fromisoformat(start), int(event_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _range_conditions(start: Optional[datetime], end: Optional[datetime]) -> List[Any]:
+    # Sự kiện giao với [start, end): bắt đầu trước `end` và (bắt đầu từ `start` hoặc kết thúc
+    # sau `start`). Chỉ xét sự kiện bắt đầu không quá EVENTS_RANGE_LOOKBACK_DAYS ngày trước
+    # `start`, nên start_time luôn bị chặn hai đầu và truy vấn chỉ quét một đoạn của index
+    # (user_id, start_time) / (start_time); sự kiện dài hơn được lấy riêng (_long_event_ids).
+    if start is not None and end is not None and start >= end:
+        raise ValueError("'from' must be before 'to'")
+    conditions = []
+    if end is not None:
+        conditions.append(Event.start_time < end)
+    if start is not None:
+        conditions.append(Event.start_time >= start - timedelta(days=EVENTS_RANGE_LOOKBACK_DAYS))
+        conditions.append(or_(Event.start_time >= start, Event.end_time > start))
+    return conditions
+
+
+async def _long_event_ids(session: AsyncSession, user_id: Optional[int], start: datetime) -> List[int]:
+    # Id các sự kiện dài hơn EVENTS_RANGE_LOOKBACK_DAYS ngày còn kéo dài qua `start`: dò index
+    # theo độ dài sự kiện (ix_events_user_span / ix_events_span), chỉ đọc các sự kiện dài.
+    # Không lọc theo start_time ở đây để SQLite không chọn index start_time thay cho index đó.
+    # Trừ 1 giây bù sai số làm tròn của julianday.
+    statement = select(Event.id).where(
+        EVENT_SPAN_DAYS > EVENTS_RANGE_LOOKBACK_DAYS - 1 / 86400, Event.end_time > start
+    )
+    if user_id is not None:
+        statement = statement.where(Event.user_id == user_id)
+    return list((await session.exec(statement)).all())
+
+
+async def _stream_page(statement: Select, limit: int, extra: Mapping[str, Any]) -> AsyncIterator[bytes]:
+    # {"events": [...], "next_cursor": ..., ...extra}: các dòng được đọc và mã hóa (orjson) theo
+    # từng chunk. Dùng connection riêng vì session của request có thể đã đóng khi body được gửi.
+    sent = 0
+    last = None
+    has_more = False
+    yield b'{"events":['
+    async with async_engine.connect() as conn:
+        result = await conn.stream(statement)
+        async for rows in result.partitions(EVENTS_STREAM_CHUNK):
+            # Dòng thừa (limit + 1) chỉ để biết còn trang sau
+            page = rows[:limit - sent]
+            has_more = has_more or len(page) < len(rows)
+            if page:
+                chunk = orjson.dumps([dict(zip(EVENT_KEYS, row)) for row in page], option=orjson.OPT_UTC_Z)[1:-1]
+                yield (b"," if sent else b"") + chunk
+                sent += len(page)
+                last = page[-1]
+    tail = {"next_cursor": encode_cursor(last) if has_more else None, **extra}
+    yield b"]," + orjson.dumps(tail)[1:]
+
+
+async def page_events(session: AsyncSession, user_id: Optional[int] = None, limit: Optional[int] = None,
+                      cursor: Optional[str] = None, count: bool = False,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      headers: Optional[Mapping[str, str]] = None) -> StreamingResponse:
+    # Một trang sự kiện (của một user hoặc toàn bộ) sắp theo start_time rồi id, dạng
+    # {"events", "next_cursor"}; "next_cursor" là None ở trang cuối. "count" (tổng số sự kiện)
+    # chỉ được đếm khi yêu cầu. `start`/`end` (tham số from/to): chỉ lấy sự kiện giao với
+    # khoảng [start, end). Lỗi tham số (ValueError) được báo trước khi bắt đầu stream.
+    limit = max(1, min(limit or EVENTS_PAGE_SIZE, EVENTS_PAGE_MAX))
+    conditions = [Event.user_id == user_id] if user_id is not None else []
+    conditions += _range_conditions(start, end)
+    statement = select(*EVENT_COLUMNS).where(*conditions)
+    columns = Event.__table__.c
+    counted = select(func.count()).select_from(Event).where(*conditions)
+    long_ids = await _long_event_ids(session, user_id, start) if start is not None else []
+    if long_ids:
+        # UNION ALL với các sự kiện dài bắt đầu trước đoạn quét (lấy theo khóa chính); SQLite
+        # trộn (MERGE) hai nhánh đã sắp theo (start_time, id), cursor được đẩy vào từng nhánh
+        longer = [Event.id.in_(long_ids), Event.start_time < start - timedelta(days=EVENTS_RANGE_LOOKBACK_DAYS)]
+        if end is not None:
+            longer.append(Event.start_time < end)
+        source = union_all(statement, select(*EVENT_COLUMNS).where(*longer)).subquery()
+        statement = select(*source.c)
+        columns = source.c
+        counted = select(func.count()).select_from(source)
+    if cursor:
+        after, event_id = decode_cursor(cursor)
+        statement = statement.where(tuple_(columns.start_time, columns.id) > tuple_(after, event_id))
+    # Lấy thừa một dòng để biết còn trang sau hay không
+    statement = statement.order_by(columns.start_time, columns.id).limit(limit + 1)
+    extra = {}
+    if count:
+        extra["count"] = (await session.exec(counted)).one()
+    # Trả connection của session về pool trước khi stream (việc stream dùng connection riêng);
+    # nếu không, mỗi request giữ hai connection và pool cạn khi nhiều request đồng thời
+    await session.close()
+    return StreamingResponse(_stream_page(statement, limit, extra), media_type="application/json",
+                             headers=headers)
@@ -0,0 +1,49 @@
+import os
+import re
+from typing import Any, Dict, Optional
+
+from sqlalchemy import column, literal_column, table
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Event
+
+# ======= TÌM KIẾM SỰ KIỆN =======
+# Tìm theo tên sự kiện và địa điểm trên bảng FTS5 events_fts (tạo bởi migration "events_fts"):
+# không phân biệt hoa thường và dấu, mỗi từ khớp theo tiền tố ("hop pho" khớp "Họp phòng").
+
+# Số kết quả mặc định và tối đa của một lần tìm
+EVENTS_SEARCH_LIMIT = int(os.getenv("EVENTS_SEARCH_LIMIT", "10"))
+EVENTS_SEARCH_MAX = int(os.getenv("EVENTS_SEARCH_MAX", "100"))
+
+EVENTS_FTS = table("events_fts", column("rowid"))
+_WORD = re.compile(r"\w+")
+
+
+def fold_query(q: str) -> Optional[str]:
+    # Câu truy vấn FTS5 từ chuỗi người dùng gõ; None nếu không có từ nào. Mỗi từ được đặt trong
+    # ngoặc kép (ký tự đặc biệt của cú pháp FTS5 không có tác dụng) và thêm * để khớp tiền tố.
+    words = _WORD.findall(q.replace("đ", "d").replace("Đ", "D"))
+    if not words:
+        return None
+    return "{event_name location} : (" + " ".join(f'"{word}"*' for word in words) + ")"
+
+
+async def search_events(session: AsyncSession, user_id: int, q: str,
+                        limit: Optional[int] = None) -> Dict[str, Any]:
+    # Sự kiện của user khớp mọi từ trong `q`, mới nhất trước
+    limit = max(1, min(limit or EVENTS_SEARCH_LIMIT, EVENTS_SEARCH_MAX))
+    match = fold_query(q)
+    if match is None:
+        return {"events": []}
+    # Lọc user trong FTS (user_id là một cột được index) để chỉ join các dòng của user đó
+    match = f'user_id : "{user_id}" AND {match}'
+    statement = (
+        select(Event)
+        .join(EVENTS_FTS, EVENTS_FTS.c.rowid == Event.id)
+        .where(literal_column("events_fts").op("MATCH")(match))
+        .order_by(Event.start_time.desc(), Event.id.desc())
+        .limit(limit)
+    )
+    events = (await session.exec(statement)).all()
+    return {"events": [event.dict() for event in events]}
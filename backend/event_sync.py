@@ -0,0 +1,74 @@
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import column, func, table
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Event, EventTombstone
+
+# ======= ĐỒNG BỘ DELTA =======
+# Client giữ bản sao cục bộ các sự kiện của user và một cursor (revision lớn nhất đã đồng bộ).
+# Mỗi lần đồng bộ chỉ lấy các sự kiện được tạo/sửa và các sự kiện bị xóa có revision lớn hơn
+# cursor (O(số thay đổi) thay vì tải lại toàn bộ). revision/tombstone do trigger của migration
+# "event_sync" ghi.
+
+# Số thay đổi mặc định và tối đa trong một lần gọi
+EVENTS_SYNC_LIMIT = int(os.getenv("EVENTS_SYNC_LIMIT", "500"))
+EVENTS_SYNC_MAX = int(os.getenv("EVENTS_SYNC_MAX", "5000"))
+
+EVENT_REVISION = table("event_revision", column("id"), column("value"))
+
+
+async def current_revision(session: AsyncSession) -> int:
+    return (await session.exec(select(EVENT_REVISION.c.value).where(EVENT_REVISION.c.id == 1))).one()
+
+
+async def user_revision(session: AsyncSession, user_id: int) -> int:
+    # Revision lớn nhất trong các sự kiện và tombstone của user: tăng mỗi khi một sự kiện của user
+    # được tạo/sửa/xóa (hai lần dò index (user_id, revision))
+    events = select(func.max(Event.revision)).where(Event.user_id == user_id).scalar_subquery()
+    tombstones = select(func.max(EventTombstone.revision)).where(EventTombstone.user_id == user_id).scalar_subquery()
+    return (await session.exec(select(func.max(func.coalesce(events, 0), func.coalesce(tombstones, 0))))).one()
+
+
+async def list_changes(session: AsyncSession, user_id: int, since: Optional[int] = None,
+                       limit: Optional[int] = None) -> Dict[str, Any]:
+    # {"events": sự kiện mới/đã sửa (bản đầy đủ), "deleted": id các sự kiện đã xóa,
+    #  "cursor": truyền vào `since` lần sau, "has_more": còn thay đổi chưa trả}.
+    # Không có `since`: chỉ trả cursor hiện tại (lấy trước khi tải toàn bộ danh sách lần đầu).
+    limit = max(1, min(limit or EVENTS_SYNC_LIMIT, EVENTS_SYNC_MAX))
+    # Đọc bộ đếm trước: mọi revision <= head đã được commit, nên trả head làm cursor không bỏ
+    # sót thay đổi nào đang được ghi song song
+    head = await current_revision(session)
+    if since is None:
+        return {"events": [], "deleted": [], "cursor": head, "has_more": False}
+    if since > head:
+        raise ValueError("Cursor is ahead of the server, resync the full list")
+
+    events = (await session.exec(
+        select(Event)
+        .where(Event.user_id == user_id, Event.revision > since, Event.revision <= head)
+        .order_by(Event.revision)
+        .limit(limit + 1)
+    )).all()
+    # Bỏ tombstone của sự kiện hiện vẫn thuộc user (đã chuyển đi rồi chuyển lại, hoặc id được
+    # dùng lại): sự kiện đó có revision mới hơn và nằm trong "events"
+    alive = select(Event.id).where(Event.id == EventTombstone.event_id, Event.user_id == user_id)
+    tombstones = (await session.exec(
+        select(EventTombstone)
+        .where(EventTombstone.user_id == user_id, EventTombstone.revision > since,
+               EventTombstone.revision <= head, ~alive.exists())
+        .order_by(EventTombstone.revision)
+        .limit(limit + 1)
+    )).all()
+
+    changes = sorted([*events, *tombstones], key=lambda change: change.revision)
+    page = changes[:limit]
+    has_more = len(changes) > limit
+    return {
+        "events": [change.dict() for change in page if isinstance(change, Event)],
+        "deleted": [change.event_id for change in page if isinstance(change, EventTombstone)],
+        "cursor": page[-1].revision if has_more else head,
+        "has_more": has_more,
+    }
@@ -1,9 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api import users, events, nlp
-from db import init_db
+from db import init_db, engine, async_engine
+from sqlmodel import Session, func, select
+from models import Event
 import uvicorn
 from reminders import start_scheduler, stop_scheduler
+from nlp.patterns import REGISTRY
+from nlp.gazetteer import GAZETTEER
+from nlp_pool import stop_pool
 
 app = FastAPI(title="Event Assistant API")
 
@@ -41,6 +46,33 @@ def _start_bg_tasks():
         print(f"Failed to start reminder scheduler: {e}")
 
 
+@app.on_event("startup")
+def _warm_nlp_patterns():
+    # Compile và chạy thử toàn bộ regex NLP trước request đầu tiên
+    count = REGISTRY.warm()
+    print(f"[nlp] Đã nạp {count} pattern")
+
+
+@app.on_event("startup")
+def _load_location_gazetteer():
+    # Nạp location đã lưu trong sự kiện của từng người dùng vào gazetteer của bước trích xuất
+    # địa điểm; location dùng gần đây nhất nạp sau cùng để được giữ lại khi vượt giới hạn
+    try:
+        statement = (
+            select(Event.user_id, Event.location)
+            .where(Event.location.is_not(None))
+            .group_by(Event.user_id, Event.location)
+            .order_by(func.max(Event.id))
+        )
+        with Session(engine) as session:
+            rows = session.exec(statement).all()
+        added = GAZETTEER.learn_many(rows)
+        stats = GAZETTEER.stats()
+        print(f"[nlp] Gazetteer: {stats['shared']} địa điểm chung, {added} location của {stats['users']} người dùng")
+    except Exception as e:
+        print(f"Failed to load location gazetteer: {e}")
+
+
 @app.on_event("shutdown")
 def _stop_bg_tasks():
     try:
@@ -48,6 +80,18 @@ def _stop_bg_tasks():
     except Exception:
         pass
 
+
+@app.on_event("shutdown")
+def _stop_nlp_pool():
+    # Dừng các worker process của endpoint /nlp/parse/batch (nếu đã khởi tạo)
+    stop_pool()
+
+
+@app.on_event("shutdown")
+async def _close_async_engine():
+    # Đóng các connection aiosqlite (mỗi connection giữ một thread riêng)
+    await async_engine.dispose()
+
 # @app.get("/")
 # async def root():
 #     return {"status": "ok", "message": "Event Assistant API is running"}
@@ -0,0 +1,198 @@
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Engine, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import SQLModel
+
+import models  # noqa: F401  (đăng ký các bảng vào SQLModel.metadata)
+
+# ======= MIGRATION SCHEMA =======
+# create_all chỉ tạo bảng còn thiếu, không thêm cột/index vào bảng đã có (vd. database.db cũ).
+# Mỗi thay đổi schema là một migration có số phiên bản tăng dần; phiên bản đã chạy được ghi
+# vào bảng schema_migrations và mỗi migration chỉ chạy một lần, lúc khởi động (db.init_db).
+# Migration phải chạy lại được (IF NOT EXISTS / kiểm tra trước): DDL của SQLite qua driver
+# Python không nằm trọn trong transaction, lỗi giữa chừng thì lần khởi động sau chạy lại.
+
+Migration = Tuple[int, str, Callable[[Connection], None]]
+
+
+def _create_indexes(conn: Connection, table: str, *names: str) -> None:
+    # Tạo các index (khai báo trong models) nếu chưa có. Dùng IF NOT EXISTS thay cho
+    # checkfirst: SQLAlchemy không đọc được index theo biểu thức (ix_events_user_span)
+    for index in SQLModel.metadata.tables[table].indexes:
+        if index.name in names:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _unique_columns(conn: Connection, table: str) -> List[Tuple[str, ...]]:
+    # Các bộ cột đã có ràng buộc/index UNIQUE (kể cả UNIQUE viết trong CREATE TABLE)
+    result = []
+    for row in conn.execute(text(f'PRAGMA index_list("{table}")')).mappings():
+        if row["unique"]:
+            info = conn.execute(text(f'PRAGMA index_info("{row["name"]}")')).mappings()
+            result.append(tuple(col["name"] for col in info))
+    return result
+
+
+def _event_range_indexes(conn: Connection) -> None:
+    _create_indexes(conn, "events", "ix_events_user_start", "ix_events_user_span", "ix_events_start")
+
+
+def _reminder_pending_index(conn: Connection) -> None:
+    _create_indexes(conn, "events", "ix_events_reminder_pending")
+
+
+def _users_unique(conn: Connection) -> None:
+    # Lỗi (IntegrityError) nếu dữ liệu cũ đã có username/email trùng: cần xử lý tay trước
+    unique = _unique_columns(conn, "users")
+    for column in ("username", "email"):
+        if (column,) not in unique:
+            _create_indexes(conn, "users", f"ix_users_{column}")
+
+
+# Bảng tìm kiếm toàn văn cho sự kiện (event_name, location), nội dung lấy từ bảng events
+# (external content, không lưu lặp văn bản). user_id được index như một từ để lọc theo user
+# ngay trong FTS. unicode61 + remove_diacritics 2 bỏ dấu tiếng Việt khi index và khi tìm;
+# riêng đ/Đ là chữ cái riêng (không phải d + dấu) nên được đổi thành d trước khi index
+# (event_search.fold_query làm tương tự cho câu tìm kiếm).
+def _fold(column: str) -> str:
+    return f"replace(replace({column}, 'đ', 'd'), 'Đ', 'D')"
+
+
+def _fts_values(row: str) -> str:
+    return f"{row}.id, {_fold(f'{row}.event_name')}, {_fold(f'{row}.location')}, {row}.user_id"
+
+
+EVENTS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5("
+    "event_name, location, user_id, content='events', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    # Trigger giữ index đồng bộ với mọi thao tác ghi vào events (API, import, thao tác hàng loạt)
+    "CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN "
+    "INSERT INTO events_fts (rowid, event_name, location, user_id) "
+    f"VALUES ({_fts_values('new')}); END",
+    "CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN "
+    "INSERT INTO events_fts (events_fts, rowid, event_name, location, user_id) "
+    f"VALUES ('delete', {_fts_values('old')}); END",
+    # Chỉ index lại khi các cột được tìm kiếm thay đổi (không phải khi đánh dấu đã gửi nhắc nhở)
+    "CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF event_name, location, user_id "
+    "ON events BEGIN "
+    "INSERT INTO events_fts (events_fts, rowid, event_name, location, user_id) "
+    f"VALUES ('delete', {_fts_values('old')}); "
+    "INSERT INTO events_fts (rowid, event_name, location, user_id) "
+    f"VALUES ({_fts_values('new')}); END",
+)
+
+
+def _events_fts(conn: Connection) -> None:
+    for statement in EVENTS_FTS_DDL:
+        conn.execute(text(statement))
+    # Index lại toàn bộ sự kiện đã có ('rebuild' của FTS5 đọc thẳng bảng events, không đổi đ)
+    conn.execute(text("INSERT INTO events_fts (events_fts) VALUES ('delete-all')"))
+    conn.execute(text(
+        f"INSERT INTO events_fts (rowid, event_name, location, user_id) SELECT {_fts_values('events')} FROM events"
+    ))
+
+
+# Đồng bộ delta: mỗi lần một sự kiện được tạo/sửa, trigger lấy số tiếp theo của bộ đếm
+# event_revision (một dòng) làm revision của sự kiện; khi xóa (hoặc chuyển sang user khác) thì
+# ghi tombstone với revision mới. Revision được cấp trong lúc giữ khóa ghi của SQLite nên tăng
+# theo đúng thứ tự commit: client đã thấy revision r thì mọi thay đổi sau đó đều có revision > r.
+# Định dạng thời gian giống SQLAlchemy lưu DateTime ('YYYY-MM-DD HH:MM:SS.ffffff')
+_NOW = "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+_NEXT_REVISION = "UPDATE event_revision SET value = value + 1 WHERE id = 1"
+_REVISION = "(SELECT value FROM event_revision WHERE id = 1)"
+
+
+def _tombstone(row: str) -> str:
+    return (
+        "INSERT OR REPLACE INTO event_tombstones (event_id, user_id, revision, deleted_at) "
+        f"SELECT {row}.id, {row}.user_id, {_REVISION}, {_NOW}"
+    )
+
+
+EVENT_SYNC_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS events_sync_insert AFTER INSERT ON events BEGIN "
+    f"{_NEXT_REVISION}; "
+    f"UPDATE events SET revision = {_REVISION}, updated_at = coalesce(new.updated_at, {_NOW}) "
+    "WHERE id = new.id; END",
+    # WHEN: bỏ qua chính câu UPDATE gán revision ở trên
+    "CREATE TRIGGER IF NOT EXISTS events_sync_update AFTER UPDATE ON events "
+    "WHEN new.revision IS old.revision BEGIN "
+    f"{_NEXT_REVISION}; "
+    f"UPDATE events SET revision = {_REVISION}, updated_at = {_NOW} WHERE id = new.id; "
+    # Sự kiện chuyển sang user khác: user cũ nhận tombstone
+    f"{_tombstone('old')} WHERE old.user_id IS NOT new.user_id; END",
+    "CREATE TRIGGER IF NOT EXISTS events_sync_delete AFTER DELETE ON events BEGIN "
+    f"{_NEXT_REVISION}; {_tombstone('old')}; END",
+)
+
+
+def _columns(conn: Connection, table: str) -> List[str]:
+    return [row["name"] for row in conn.execute(text(f'PRAGMA table_info("{table}")')).mappings()]
+
+
+def _event_sync(conn: Connection) -> None:
+    # Cột mới cho database cũ (database mới đã có từ create_all)
+    columns = _columns(conn, "events")
+    if "updated_at" not in columns:
+        conn.execute(text("ALTER TABLE events ADD COLUMN updated_at DATETIME"))
+    if "revision" not in columns:
+        conn.execute(text("ALTER TABLE events ADD COLUMN revision INTEGER"))
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS event_revision (id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL)"
+    ))
+    conn.execute(text("INSERT OR IGNORE INTO event_revision (id, value) VALUES (1, 0)"))
+    # Sự kiện đã có: updated_at = created_at, revision theo thứ tự id
+    conn.execute(text("UPDATE events SET updated_at = created_at WHERE updated_at IS NULL"))
+    conn.execute(text(f"UPDATE events SET revision = {_REVISION} + id WHERE revision IS NULL"))
+    conn.execute(text(
+        "UPDATE event_revision SET value = max(value, (SELECT coalesce(max(revision), 0) FROM events)) WHERE id = 1"
+    ))
+    _create_indexes(conn, "events", "ix_events_user_revision")
+    _create_indexes(conn, "event_tombstones", "ix_event_tombstones_user_revision")
+    for statement in EVENT_SYNC_TRIGGERS:
+        conn.execute(text(statement))
+
+
+def _event_span_index(conn: Connection) -> None:
+    _create_indexes(conn, "events", "ix_events_span")
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "event_range_indexes", _event_range_indexes),
+    (2, "reminder_pending_index", _reminder_pending_index),
+    (3, "users_unique", _users_unique),
+    (4, "events_fts", _events_fts),
+    (5, "event_sync", _event_sync),
+    (6, "event_span_index", _event_span_index),
+]
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    # Chạy các migration chưa áp dụng theo thứ tự; trả về danh sách phiên bản vừa chạy
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+        ))
+        applied = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+    done = []
+    for version, name, migrate in sorted(MIGRATIONS):
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                migrate(conn)
+                # OR IGNORE: process khác khởi động cùng lúc có thể đã ghi phiên bản này
+                conn.execute(
+                    text("INSERT OR IGNORE INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": version, "n": name, "t": datetime.utcnow().isoformat()},
+                )
+        except Exception as e:
+            raise RuntimeError(f"Migration {version} ({name}) failed: {e}") from e
+        done.append(version)
+    return done
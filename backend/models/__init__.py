@@ -1,3 +1,3 @@
-from .models import User, Event
+from .models import User, Event, EventTombstone
 
-__all__ = ["User", "Event"]
\ No newline at end of file
+__all__ = ["User", "Event", "EventTombstone"]
\ No newline at end of file
@@ -2,15 +2,16 @@
 from sqlmodel import SQLModel, Field
 from typing import Optional
 from datetime import datetime
-from sqlalchemy import Column, String
+from sqlalchemy import Column, Index, String, func
 
 
 class User(SQLModel, table=True):
     __tablename__ = "users"
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    username: str
-    email: str
+    # unique: kiểm tra trùng khi đăng ký là một lần dò index (ix_users_username, ix_users_email)
+    username: str = Field(index=True, unique=True)
+    email: str = Field(index=True, unique=True)
     password_hash: str = Field(sa_column=Column("password", String))
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -31,3 +32,38 @@ class Event(SQLModel, table=True):
     reminder_sent: bool = False
     reminder_sent_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+# updated_at/revision được trigger cập nhật mỗi khi sự kiện thay đổi (migration "event_sync").
+# revision tăng dần theo thứ tự commit trên toàn database, dùng làm cursor cho đồng bộ delta
+    updated_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
+    revision: Optional[int] = None
+
+
+class EventTombstone(SQLModel, table=True):
+    # Dấu vết của sự kiện đã xóa (hoặc đã chuyển sang user khác) để client đồng bộ delta
+    # biết cần xóa bản sao cục bộ; được ghi bởi trigger trên bảng events
+    __tablename__ = "event_tombstones"
+
+    event_id: int = Field(primary_key=True)
+    user_id: int = Field(primary_key=True)
+    revision: int
+    deleted_at: datetime
+
+
+# Lịch theo tháng/khoảng thời gian: lọc theo user rồi theo khoảng start_time
+Index("ix_events_user_start", Event.__table__.c.user_id, Event.__table__.c.start_time)
+# Danh sách chung (GET /events) sắp và phân trang theo start_time
+Index("ix_events_start", Event.__table__.c.start_time)
+# Reminder chưa gửi: index một phần, chỉ chứa các sự kiện còn chờ gửi nhắc nhở
+Index(
+    "ix_events_reminder_pending",
+    Event.__table__.c.start_time,
+    sqlite_where=Event.__table__.c.time_reminder.isnot(None) & Event.__table__.c.reminder_sent_at.is_(None),
+)
+# Độ dài (ngày) của sự kiện có end_time. Index theo (user, độ dài) và theo độ dài (danh sách chung)
+# để tìm riêng các sự kiện dài kéo dài qua mốc "from" mà không quét cả bảng
+EVENT_SPAN_DAYS = func.julianday(Event.__table__.c.end_time) - func.julianday(Event.__table__.c.start_time)
+Index("ix_events_user_span", Event.__table__.c.user_id, EVENT_SPAN_DAYS)
+Index("ix_events_span", EVENT_SPAN_DAYS)
+# Đồng bộ delta: các sự kiện/tombstone của user có revision lớn hơn cursor
+Index("ix_events_user_revision", Event.__table__.c.user_id, Event.__table__.c.revision)
+Index("ix_event_tombstones_user_revision", EventTombstone.__table__.c.user_id, EventTombstone.__table__.c.revision)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class UserCreate(BaseModel):
     username: str
@@ -15,5 +15,32 @@ class EventCreate(BaseModel):
     location: Optional[str] = None
     time_reminder: Optional[int] = None
 
+class EventUpdate(EventCreate):
+    id: int
+
+class BulkEventsCreate(BaseModel):
+    events: List[EventCreate]
+
+class BulkEventsUpdate(BaseModel):
+    events: List[EventUpdate]
+
+class BulkEventsDelete(BaseModel):
+    ids: List[int]
+
+# user_id (không bắt buộc): dùng thêm các location người dùng đó đã lưu khi trích xuất địa điểm
 class TextRequest(BaseModel):
-    text: str
\ No newline at end of file
+    text: str
+    user_id: Optional[int] = None
+
+class BatchTextRequest(BaseModel):
+    texts: List[str]
+    user_id: Optional[int] = None
+
+class IncrementalTextRequest(BaseModel):
+    # Không có session: mở phiên mới. `text` gửi lại toàn bộ văn bản; nếu không có thì
+    # văn bản lần trước bỏ `delete` ký tự cuối rồi nối thêm `append`. `user_id` chỉ dùng khi mở phiên
+    session: Optional[str] = None
+    user_id: Optional[int] = None
+    text: Optional[str] = None
+    append: str = ""
+    delete: int = 0
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Cache kết quả parse (LRU + TTL) cho NLPProcessor.
+# Kết quả chỉ phụ thuộc vào văn bản đã chuẩn hóa (khóa `text`, có thể kèm thông tin
+# khác của đầu vào) và thời điểm tham chiếu:
+# - ngày hiện tại (mai, thứ 6, 20/11...) -> toàn bộ cache bị xóa khi sang ngày mới;
+# - giờ:phút hiện tại, chỉ khi sự kiện rơi vào hôm nay/ngày mai (giờ đã qua thì dời sang hôm sau).
+# Vì vậy mỗi kết quả được lưu dưới một trong hai khóa:
+#   (text, ngày, None)          — không phụ thuộc giờ hiện tại
+#   (text, ngày, (giờ, phút))   — chỉ dùng lại trong cùng phút
+
+
+class ParseCache:
+    def __init__(self, maxsize: int = 2048, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._day: Optional[date] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rollovers = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def _check_day(self, now: datetime) -> None:
+        # Sang ngày mới: mọi kết quả có ngày tương đối đều sai, xóa hết
+        today = now.date()
+        if self._day != today:
+            if self._day is not None:
+                self.rollovers += 1
+            self._entries.clear()
+            self._day = today
+
+    def _lookup(self, key: Hashable, clock: float) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < clock:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def get(self, text: Hashable, now: datetime) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        clock = time.monotonic()
+        today = now.date()
+        with self._lock:
+            self._check_day(now)
+            result = self._lookup((text, today, None), clock)
+            if result is None:
+                result = self._lookup((text, today, (now.hour, now.minute)), clock)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return dict(result)
+
+    def put(self, text: Hashable, now: datetime, result: Dict[str, Any], depends_on_clock: bool) -> None:
+        if not self.enabled:
+            return
+        today = now.date()
+        key = (text, today, (now.hour, now.minute) if depends_on_clock else None)
+        with self._lock:
+            self._check_day(now)
+            self._entries[key] = (time.monotonic() + self.ttl, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'evictions': self.evictions,
+            'rollovers': self.rollovers,
+        }
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rollovers = 0
@@ -1,76 +1,132 @@
-import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from typing import Dict, Optional, Tuple
 
+from nlp import patterns
+from nlp.preprocess import remove_diacritics
+
+# Các chuỗi ngày/giờ được so trên bản không dấu ('thu sau' = 'thứ sáu', '9 gio' = '9 giờ')
+TIME_STRING_PATTERNS = [
+    patterns.compile('datetime.clock', r'(\d{1,2}):(\d{2})'),
+    patterns.compile('datetime.hour_h', r'(\d{1,2})h(\d{0,2})'),
+    patterns.compile('datetime.hour_gio', r'(\d{1,2})\s*gio\s*(\d{0,2})'),
+    patterns.compile('datetime.hour_g', r'(\d{1,2})g(\d{0,2})'),
+]
+HOUR_ONLY_PATTERN = patterns.compile('datetime.hour_only', r'(\d{1,2})')
+
+NUMERIC_DATE_PATTERN = patterns.compile('datetime.numeric_date', r'\d{1,2}[/-]\d{1,2}')
+DATE_SEPARATOR_PATTERN = patterns.compile('datetime.date_separator', r'[/-]')
+MONTH_WORDS_PATTERN = patterns.compile('datetime.month_words', r"\d{1,2}\s*thang\s*\d{1,2}")
+
+DAY_MAP = {
+    'thu 2': 0, 'thu hai': 0, 't2': 0,
+    'thu 3': 1, 'thu ba': 1, 't3': 1,
+    'thu 4': 2, 'thu tu': 2, 't4': 2,
+    'thu 5': 3, 'thu nam': 3, 't5': 3,
+    'thu 6': 4, 'thu sau': 4, 't6': 4,
+    'thu 7': 5, 'thu bay': 5, 't7': 5,
+    'chu nhat': 6, 'cn': 6,
+}
+NUMBER_PATTERN = patterns.compile('datetime.number', r"(\d{1,2})")
+
 
 def parse_time_string(time_str: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
     if not time_str:
         return None, None
-    s = time_str.strip().lower()
-    m = re.match(r'(\d{1,2}):(\d{2})', s)
-    if m:
-        return int(m.group(1)), int(m.group(2))
-    m = re.match(r'(\d{1,2})h(\d{0,2})', s)
-    if m:
-        hour = int(m.group(1))
-        minute = int(m.group(2)) if m.group(2) else 0
-        return hour, minute
-    m = re.match(r'(\d{1,2})\s*giờ\s*(\d{0,2})', s)
-    if m:
-        hour = int(m.group(1))
-        minute = int(m.group(2)) if m.group(2) else 0
-        return hour, minute
-    m = re.match(r'(\d{1,2})g(\d{0,2})', s)
-    if m:
-        hour = int(m.group(1))
-        minute = int(m.group(2)) if m.group(2) else 0
-        return hour, minute
-    m = re.match(r'(\d{1,2})', s)
+    s = remove_diacritics(time_str.strip().lower())
+    for pattern in TIME_STRING_PATTERNS:
+        m = pattern.match(s)
+        if m:
+            hour = int(m.group(1))
+            minute = int(m.group(2)) if m.group(2) else 0
+            return hour, minute
+    m = HOUR_ONLY_PATTERN.match(s)
     if m:
         return int(m.group(1)), 0
     return None, None
 
 
-def build_datetime(time_info: Dict) -> Tuple[datetime, Optional[datetime]]:
-    now = datetime.now()
-    date_text = time_info.get('date_text', 'hôm nay').lower()
-    base_date = now.date()
+# Cụm ngày tương đối (không dấu) -> số ngày tính từ hôm nay
+RELATIVE_DAYS = {'hom nay': 0, 'bua nay': 0, 'mai': 1, 'ngay mai': 1, 'ngay kia': 2, 'mot': 2}
+WEEKDAY_SHORT = frozenset({'t2', 't3', 't4', 't5', 't6', 't7', 'cn'})
+# Các cụm ngày trong tuần được tính sẵn: mỗi khóa của DAY_MAP kèm một trong các đuôi này
+WEEK_SUFFIXES = ('', ' tuan sau', ' tuan toi', ' tuan nay')
+# Số cụm lạ (không có sẵn trong bảng) được nhớ thêm cho mỗi ngày tham chiếu
+RELATIVE_MEMO_LIMIT = 1024
 
-    if date_text in ['hôm nay', 'bữa nay']:
-        base_date = now.date()
-    elif date_text in ['mai', 'ngày mai']:
-        base_date = (now + timedelta(days=1)).date()
-    elif date_text in ['ngày kia', 'mốt']:
-        base_date = (now + timedelta(days=2)).date()
-    elif 'thứ' in date_text or date_text in ['t2', 't3', 't4', 't5', 't6', 't7', 'cn']:
-        day_map = {
-            'thứ 2': 0, 'thứ hai': 0, 't2': 0,
-            'thứ 3': 1, 'thứ ba': 1, 't3': 1,
-            'thứ 4': 2, 'thứ tư': 2, 't4': 2,
-            'thứ 5': 3, 'thứ năm': 3, 't5': 3,
-            'thứ 6': 4, 'thứ sáu': 4, 't6': 4,
-            'thứ 7': 5, 'thứ bảy': 5, 't7': 5,
-            'chủ nhật': 6, 'cn': 6,
-        }
-        target_day = None
-        for key, day_num in day_map.items():
-            if key in date_text.lower():
-                target_day = day_num
-                break
-        if target_day is not None:
-            current_day = now.weekday()
-            days_ahead = (target_day - current_day) % 7
+
+def _weekday_offset(date_key: str, weekday: int) -> Optional[int]:
+    # Số ngày từ hôm nay (thứ `weekday`, 0 = thứ 2) tới ngày trong tuần nhắc trong `date_key`
+    # So theo trọn từ: bỏ dấu thì 'thu ba' là tiền tố của 'thu bay'
+    padded = f' {date_key} '
+    for key, day_num in DAY_MAP.items():
+        if f' {key} ' in padded:
+            days_ahead = (day_num - weekday) % 7
             if days_ahead == 0:
                 days_ahead = 7
-            if 'tuần' in date_text and ('sau' in date_text or 'tới' in date_text):
+            if 'tuan sau' in date_key or 'tuan toi' in date_key:
                 if days_ahead < 7:
                     days_ahead += 7
+            return days_ahead
+    return None
+
+
+class RelativeDates:
+    """Bảng cụm ngày tương đối (không dấu) -> ngày cụ thể, cho một ngày tham chiếu.
+
+    'mai', 'mốt', 'thứ 6 tuần sau', 'cn'... được tính sẵn một lần cho mỗi ngày nên mỗi lần
+    parse chỉ còn một lần tra bảng. `get` trả None nếu cụm không phải ngày tương đối.
+    """
+
+    def __init__(self, today: date):
+        self.today = today
+        self._table: Dict[str, Optional[date]] = {
+            key: today + timedelta(days=days) for key, days in RELATIVE_DAYS.items()
+        }
+        for key in DAY_MAP:
+            for suffix in WEEK_SUFFIXES:
+                self._table[key + suffix] = self._compute(key + suffix)
+        self._size = len(self._table)
+
+    def _compute(self, date_key: str) -> Optional[date]:
+        if 'thu' in date_key or 'chu nhat' in date_key or date_key in WEEKDAY_SHORT:
+            days_ahead = _weekday_offset(date_key, self.today.weekday())
+            # Có dạng ngày trong tuần nhưng không rõ thứ mấy: giữ hôm nay
+            return self.today + timedelta(days=days_ahead) if days_ahead is not None else self.today
+        return None
+
+    def get(self, date_key: str) -> Optional[date]:
+        try:
+            return self._table[date_key]
+        except KeyError:
+            value = self._compute(date_key)
+            if len(self._table) < self._size + RELATIVE_MEMO_LIMIT:
+                self._table[date_key] = value
+            return value
+
+
+@lru_cache(maxsize=4)
+def relative_dates(today: date) -> RelativeDates:
+    # Bảng của mỗi ngày tham chiếu chỉ được dựng một lần
+    return RelativeDates(today)
+
+
+def build_datetime(time_info: Dict, now: Optional[datetime] = None) -> Tuple[datetime, Optional[datetime]]:
+    # `now`: thời điểm tham chiếu (mặc định là lúc gọi); cùng `now` thì cùng kết quả
+    if now is None:
+        now = datetime.now()
+    date_text = time_info.get('date_text', 'hôm nay').lower()
+    # So khớp trên bản không dấu để 'thu sau', 'ngay mai'... cũng được hiểu
+    date_key = remove_diacritics(date_text)
+    base_date = now.date()
 
-            base_date = (now + timedelta(days=days_ahead)).date()
-    elif re.match(r'\d{1,2}[/-]\d{1,2}', date_text):
+    relative = relative_dates(base_date).get(date_key)
+    if relative is not None:
+        base_date = relative
+    elif NUMERIC_DATE_PATTERN.match(date_text):
         # Thử parse các định dạng dd/mm hoặc dd-mm (có thể có năm)
         try:
-            parts = re.split(r'[/-]', date_text)
+            parts = DATE_SEPARATOR_PATTERN.split(date_text)
             day = int(parts[0])
             month = int(parts[1])
             year = now.year
@@ -85,10 +141,10 @@ def build_datetime(time_info: Dict) -> Tuple[datetime, Optional[datetime]]:
         except Exception as e:
             # Propagate một lỗi rõ ràng để caller có thể báo cho người dùng
             raise ValueError(f"Ngày không tồn tại hoặc không hợp lệ: '{date_text}'") from e
-    elif re.search(r"\d{1,2}\s*(?:tháng|thang)\s*\d{1,2}", date_text):
+    elif MONTH_WORDS_PATTERN.search(date_key):
         # Dạng "5 tháng 12" hoặc "ngày 5 tháng 12" (có thể có năm)
         try:
-            parts = re.findall(r"(\d{1,2})", date_text)
+            parts = NUMBER_PATTERN.findall(date_text)
             if len(parts) >= 2:
                 day = int(parts[0])
                 month = int(parts[1])
@@ -110,14 +166,14 @@ def build_datetime(time_info: Dict) -> Tuple[datetime, Optional[datetime]]:
     hour_start, minute_start = parse_time_string(time_start)
     time_period = time_info.get('time_period')
     if hour_start is not None and time_period:
-        tp = time_period.lower()
-        if tp in ('chiều', 'tối', 'đêm'):
+        tp = remove_diacritics(time_period.lower())
+        if tp in ('chieu', 'toi', 'dem'):
             if hour_start < 12:
                 hour_start = (hour_start % 12) + 12
-        elif tp == 'sáng':
+        elif tp == 'sang':
             if hour_start == 12:
                 hour_start = 0
-        elif tp == 'trưa':
+        elif tp == 'trua':
             if hour_start == 12:
                 hour_start = 12
     if all_day:
@@ -139,7 +195,6 @@ def build_datetime(time_info: Dict) -> Tuple[datetime, Optional[datetime]]:
         hour=hour_start, minute=minute_start, second=0, microsecond=0
     )
 
-    now = datetime.now()
     if start_datetime < now and start_datetime.date() == now.date():
         start_datetime += timedelta(days=1)
 
@@ -0,0 +1,92 @@
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from nlp import patterns
+from nlp.name_extractor import DEFAULT_EVENT_NAME
+
+# Parse hai tầng: pipeline regex luôn chạy trước và tự chấm độ tin cậy (0..1).
+# Chỉ khi độ tin cậy thấp hơn ngưỡng mới gọi dateparser — thư viện nặng (~0.3s để import)
+# nên chỉ được import ở lần dùng đầu tiên, trong process cần đến nó.
+
+# NLP_FALLBACK=0 tắt hẳn tầng dateparser; NLP_FALLBACK_THRESHOLD là ngưỡng độ tin cậy
+NLP_FALLBACK = os.getenv("NLP_FALLBACK", "1") == "1"
+NLP_FALLBACK_THRESHOLD = float(os.getenv("NLP_FALLBACK_THRESHOLD", "0.5"))
+
+# Chữ số còn sót trong tên sự kiện: thường là ngày/giờ mà regex không hiểu
+DIGIT_PATTERN = patterns.compile('fallback.digit', r'\d')
+
+
+def score_confidence(time_info: Dict[str, Any], event_name: str) -> float:
+    # Bắt đầu từ 1.0 và trừ dần theo những gì pipeline regex phải đoán
+    score = 1.0
+    has_date = time_info.get('has_date') or time_info.get('all_day')
+    has_time = bool(time_info.get('time_start')) or time_info.get('all_day')
+    if not has_date and not has_time:
+        # Toàn bộ thời điểm là mặc định (hôm nay/9h hoặc 19h)
+        score -= 0.5
+    elif not has_time:
+        score -= 0.1 if time_info.get('has_time_period') else 0.2
+    elif not has_date:
+        score -= 0.1
+    if not event_name or event_name == DEFAULT_EVENT_NAME:
+        score -= 0.2
+    elif DIGIT_PATTERN.search(event_name):
+        score -= 0.3
+    return round(max(0.0, min(1.0, score)), 2)
+
+
+class DateparserFallback:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._search: Optional[Callable] = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hits = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._search is not None
+
+    def _load(self) -> Optional[Callable]:
+        # Import lần đầu (thread-safe); thiếu thư viện thì tắt fallback thay vì lỗi mỗi request
+        if self._search is None and self.enabled:
+            with self._lock:
+                if self._search is None and self.enabled:
+                    try:
+                        from dateparser.search import search_dates
+                    except ImportError as e:
+                        print(f"[nlp] Không tải được dateparser, tắt fallback: {e}")
+                        self.enabled = False
+                        return None
+                    self._search = search_dates
+        return self._search
+
+    def search(self, text: str, now: datetime) -> Optional[Tuple[str, datetime]]:
+        # Trả về (cụm từ, thời điểm) đầu tiên dateparser tìm được mà chưa qua, hoặc None
+        search = self._load()
+        if search is None:
+            return None
+        self.calls += 1
+        found = search(text, languages=['vi'], settings={
+            'PREFER_DATES_FROM': 'future',
+            'RELATIVE_BASE': now.replace(second=0, microsecond=0),
+        })
+        for phrase, value in found or []:
+            if value.date() >= now.date():
+                self.hits += 1
+                return phrase, value
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'loaded': self.loaded,
+            'threshold': NLP_FALLBACK_THRESHOLD,
+            'calls': self.calls,
+            'hits': self.hits,
+        }
+
+
+FALLBACK = DateparserFallback(enabled=NLP_FALLBACK)
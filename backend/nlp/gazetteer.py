@@ -0,0 +1,259 @@
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from nlp import patterns
+from nlp.preprocess import normalize_text
+
+# Danh bạ địa điểm (gazetteer) cho bước trích xuất location: phòng, tòa nhà, thành phố trong
+# file dữ liệu (mặc định nlp/data/locations.txt, thay bằng NLP_LOCATIONS_FILE) dùng chung cho mọi
+# người dùng, cộng với các location mỗi người dùng đã lưu trong sự kiện của chính họ (nạp lúc
+# khởi động và thêm dần khi tạo/sửa/import sự kiện). Location của người này không ảnh hưởng tới
+# cách parse văn bản của người khác.
+# Khóa là dạng chuẩn hóa không dấu, cùng dạng với Lexed.folded, nên một lượt quét tìm được
+# địa điểm dài nhất dù người dùng gõ có dấu hay không. Trie theo từ (không theo ký tự):
+# văn bản đã chuẩn hóa cách nhau đúng một khoảng trắng, mỗi từ chỉ tốn một lần tra dict.
+NLP_LOCATIONS_FILE = Path(os.getenv("NLP_LOCATIONS_FILE", Path(__file__).parent / "data" / "locations.txt"))
+# Số location học được giữ cho mỗi người dùng; đầy thì bỏ location lưu lâu nhất
+NLP_GAZETTEER_USER_MAX = int(os.getenv("NLP_GAZETTEER_USER_MAX", "200"))
+# Số người dùng được giữ location đã học; đầy thì bỏ người dùng lâu nhất không lưu sự kiện
+NLP_GAZETTEER_USERS = int(os.getenv("NLP_GAZETTEER_USERS", "10000"))
+# Location dài hơn (ký tự) thường là câu mô tả chứ không phải tên địa điểm: không học
+GAZETTEER_MAX_LENGTH = 64
+
+_END = None  # khóa của node lưu số từ khi một địa điểm kết thúc tại node đó
+
+# Giống bước chuẩn hóa của nlp_processor: bỏ dấu câu và gộp khoảng trắng
+PUNCTUATION_PATTERN = patterns.compile('gazetteer.punctuation', r"[.,;!?\"']")
+WHITESPACE_PATTERN = patterns.compile('gazetteer.whitespace', r"\s+")
+
+
+def location_key(name: str) -> str:
+    # Dạng dùng làm khóa: chuẩn hóa như văn bản đầu vào (chữ thường, mở rộng viết tắt) rồi bỏ dấu
+    folded = normalize_text(name)['no_accents']
+    return WHITESPACE_PATTERN.sub(' ', PUNCTUATION_PATTERN.sub('', folded)).strip()
+
+
+def load_locations(path: Path) -> List[str]:
+    # Mỗi dòng một địa điểm; bỏ qua dòng trống và dòng chú thích '#'
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+class Gazetteer:
+    # Trie theo từ của một tập địa điểm. Bên ghi phải giữ khóa của LocationIndex (hoặc chỉ
+    # ghi lúc khởi tạo); bên đọc chỉ tra dict nên không cần khóa.
+    def __init__(self, names: Iterable[Optional[str]] = ()):
+        self._root: Dict[Any, Any] = {}
+        self._size = 0
+        for name in names:
+            self.add(name)
+
+    @staticmethod
+    def _words(name: Optional[str]) -> Optional[List[str]]:
+        if not name or len(name) > GAZETTEER_MAX_LENGTH:
+            return None
+        words = location_key(name).split(' ')
+        return words if words[0] else None
+
+    def add(self, name: Optional[str]) -> bool:
+        # Thêm một địa điểm; trả về True nếu là địa điểm mới
+        words = self._words(name)
+        if words is None:
+            return False
+        node = self._root
+        for word in words:
+            node = node.setdefault(word, {})
+        if _END in node:
+            return False
+        node[_END] = len(words)
+        self._size += 1
+        return True
+
+    def discard(self, name: Optional[str]) -> bool:
+        # Xóa một địa điểm và các node không còn dùng; trả về True nếu địa điểm có trong trie
+        words = self._words(name)
+        if words is None:
+            return False
+        path = [self._root]
+        for word in words:
+            node = path[-1].get(word)
+            if node is None:
+                return False
+            path.append(node)
+        if _END not in path[-1]:
+            return False
+        del path[-1][_END]
+        self._size -= 1
+        for word, parent, node in zip(reversed(words), reversed(path[:-1]), reversed(path[1:])):
+            if node:
+                break
+            del parent[word]
+        return True
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _longest_at(self, words: List[str], i: int, node: Dict[Any, Any]) -> Tuple[int, int]:
+        # (số từ, số ký tự) của địa điểm dài nhất bắt đầu tại words[i]; node = root[words[i]]
+        length = len(words[i])
+        best = (node[_END], length) if _END in node else (0, 0)
+        for j in range(i + 1, len(words)):
+            node = node.get(words[j])
+            if node is None:
+                break
+            length += 1 + len(words[j])
+            if _END in node:
+                best = (node[_END], length)
+        return best
+
+    def match_at(self, folded: str, pos: int) -> Optional[int]:
+        # Vị trí kết thúc của địa điểm dài nhất bắt đầu tại `pos` (đầu một từ), hoặc None
+        words = folded[pos:].split(' ')
+        node = self._root.get(words[0])
+        if node is None:
+            return None
+        count, length = self._longest_at(words, 0, node)
+        return pos + length if count else None
+
+    def spans(self, folded: str) -> List[Tuple[int, int]]:
+        # (start, end) của địa điểm dài nhất bắt đầu tại mỗi từ của văn bản, một lượt quét
+        root = self._root
+        words = folded.split(' ')
+        if root.keys().isdisjoint(words):
+            # Thường gặp nhất: không từ nào có thể mở đầu một địa điểm
+            return []
+        found = []
+        start = 0
+        for i, word in enumerate(words):
+            node = root.get(word)
+            if node is not None:
+                count, length = self._longest_at(words, i, node)
+                if count:
+                    found.append((start, start + length))
+            start += len(word) + 1
+        return found
+
+
+class UserLocations:
+    # Location một người dùng đã lưu: trie để tra và thứ tự LRU (khóa -> tên) để bỏ location cũ
+    __slots__ = ('trie', 'recent', 'version')
+
+    def __init__(self, version: int):
+        self.trie = Gazetteer()
+        self.recent: 'OrderedDict[str, str]' = OrderedDict()
+        self.version = version
+
+
+class LocationIndex:
+    def __init__(self, shared: Iterable[Optional[str]] = (), user_max: int = NLP_GAZETTEER_USER_MAX,
+                 users_max: int = NLP_GAZETTEER_USERS):
+        self.shared = Gazetteer(shared)
+        self.user_max = user_max
+        self.users_max = users_max
+        self._users: 'OrderedDict[int, UserLocations]' = OrderedDict()
+        # Chỉ bên ghi cần khóa; bên đọc chỉ tra dict
+        self._lock = threading.Lock()
+        # Phiên bản tăng dần dùng chung cho mọi người dùng: đổi mỗi khi location của một người
+        # dùng thay đổi; cache kết quả parse dùng nó để bỏ kết quả cũ
+        self._versions = itertools.count(1)
+        self.evicted_locations = 0
+        self.evicted_users = 0
+
+    def _user(self, user_id: int) -> UserLocations:
+        # Gọi khi đang giữ khóa: lấy (hoặc tạo) location của người dùng, đưa lên cuối LRU
+        entry = self._users.get(user_id)
+        if entry is None:
+            entry = self._users[user_id] = UserLocations(next(self._versions))
+            while len(self._users) > self.users_max:
+                self._users.popitem(last=False)
+                self.evicted_users += 1
+        else:
+            self._users.move_to_end(user_id)
+        return entry
+
+    def learn(self, user_id: Optional[int], name: Optional[str]) -> bool:
+        # Học location của một sự kiện người dùng vừa lưu; trả về True nếu là location mới
+        if user_id is None or not name or len(name) > GAZETTEER_MAX_LENGTH:
+            return False
+        key = location_key(name)
+        if not key:
+            return False
+        name = name.strip()
+        with self._lock:
+            entry = self._user(user_id)
+            if key in entry.recent:
+                entry.recent.move_to_end(key)
+                return False
+            entry.trie.add(name)
+            entry.recent[key] = name
+            while len(entry.recent) > self.user_max:
+                _, oldest = entry.recent.popitem(last=False)
+                entry.trie.discard(oldest)
+                self.evicted_locations += 1
+            entry.version = next(self._versions)
+        return True
+
+    def learn_many(self, items: Iterable[Tuple[Optional[int], Optional[str]]]) -> int:
+        # items: các cặp (user_id, location)
+        return sum(1 for user_id, name in items if self.learn(user_id, name))
+
+    def _tries(self, user_id: Optional[int]) -> List[Gazetteer]:
+        entry = self._users.get(user_id) if user_id is not None else None
+        return [self.shared, entry.trie] if entry is not None else [self.shared]
+
+    def match_at(self, folded: str, pos: int, user_id: Optional[int] = None) -> Optional[int]:
+        # Như Gazetteer.match_at, trên địa điểm chung và location của người dùng `user_id`
+        ends = [end for end in (trie.match_at(folded, pos) for trie in self._tries(user_id)) if end is not None]
+        return max(ends) if ends else None
+
+    def spans(self, folded: str, user_id: Optional[int] = None) -> List[Tuple[int, int]]:
+        return [span for trie in self._tries(user_id) for span in trie.spans(folded)]
+
+    def version(self, user_id: Optional[int]) -> Optional[Tuple[int, int]]:
+        # Phần khóa cache phụ thuộc gazetteer: None khi người dùng chưa có location đã học
+        # (kết quả dùng chung với mọi người dùng như vậy), không thì (user_id, phiên bản)
+        entry = self._users.get(user_id) if user_id is not None else None
+        return (user_id, entry.version) if entry is not None else None
+
+    def export(self, user_id: Optional[int]) -> Optional[Tuple[int, List[str]]]:
+        # (phiên bản, danh sách location) của người dùng, gửi kèm job cho worker process
+        with self._lock:
+            entry = self._users.get(user_id) if user_id is not None else None
+            return (entry.version, list(entry.recent.values())) if entry is not None else None
+
+    def sync(self, user_id: int, version: int, names: List[str]) -> None:
+        # Trong worker process: thay location của người dùng bằng bản của process chính nếu
+        # phiên bản khác (giữ đúng phiên bản đó để khóa cache giống process chính)
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry.version == version:
+                self._users.move_to_end(user_id)
+                return
+            entry = UserLocations(version)
+            for name in names:
+                entry.trie.add(name)
+                entry.recent[location_key(name)] = name
+            self._users[user_id] = entry
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.users_max:
+                self._users.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            learned = sum(len(entry.recent) for entry in self._users.values())
+        return {
+            'shared': len(self.shared),
+            'users': len(self._users),
+            'learned': learned,
+            'user_max': self.user_max,
+            'users_max': self.users_max,
+            'evicted_locations': self.evicted_locations,
+            'evicted_users': self.evicted_users,
+        }
+
+
+GAZETTEER = LocationIndex(load_locations(NLP_LOCATIONS_FILE))
@@ -0,0 +1,355 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from nlp import patterns
+from nlp.preprocess import fold_pattern, has_diacritics, remove_diacritics
+
+# Bộ tách span một lượt (single-pass lexer) cho văn bản tiếng Việt.
+# Văn bản được chia thành các "từ" (dãy chữ cái hoặc dãy chữ số) bằng một lần quét.
+# Mỗi luật khai báo các từ có thể mở đầu nó; tại mỗi từ chỉ các luật tương ứng được
+# thử (neo tại vị trí đó), nên chi phí tăng tuyến tính theo độ dài văn bản và gần như
+# không đổi khi thêm luật mới.
+#
+# Việc tách từ và tra luật làm trên bản không dấu (no_accents) của văn bản; luật được viết
+# một lần, có dấu, và được compile để khớp cả khi người dùng gõ không dấu. Bản không dấu có
+# cùng độ dài với văn bản gốc nên vị trí span luôn là vị trí trong văn bản gốc.
+
+DATE = 'DATE'
+TIME = 'TIME'
+PERIOD = 'PERIOD'
+REMINDER = 'REMINDER'
+LOCATION_PREFIX = 'LOCATION_PREFIX'
+RANGE = 'RANGE'
+# Từ khóa thời gian không mang giá trị, chỉ dùng để làm sạch tên sự kiện
+FILLER = 'FILLER'
+
+_PERSON = r'(?:tôi|tui|mình|em|anh|chị)'
+
+# Khóa dùng cho các luật bắt đầu bằng chữ số
+DIGIT = '#'
+
+_NHAC = ('nhắc', 'báo')
+
+# (loại span, tên luật, các từ mở đầu, pattern). Trong cùng một loại, luật đứng trước
+# được ưu tiên; tại mỗi vị trí chỉ giữ luật đầu tiên khớp của mỗi loại.
+RULES: List[Tuple[str, str, Tuple[str, ...], str]] = [
+    (REMINDER, 'reminder.keyword_before_hours', _NHAC, rf'(?:nhắc|báo)\s*{_PERSON}?\s+trước\s+(\d+)\s*(?:tiếng|giờ)'),
+    (REMINDER, 'reminder.keyword_hours_before', _NHAC, rf'(?:nhắc|báo)\s*{_PERSON}?\s+(\d+)\s*(?:tiếng|giờ)\s+trước'),
+    (REMINDER, 'reminder.before_hours', ('trước',), r'trước\s+(\d+)\s*(?:tiếng|giờ)'),
+    (REMINDER, 'reminder.hours_before', (DIGIT,), r'(\d+)\s*(?:tiếng|giờ)\s+trước'),
+    (REMINDER, 'reminder.keyword_before_minutes', _NHAC, rf'(?:nhắc|báo)\s*{_PERSON}?\s+trước\s+(\d+)\s*phút'),
+    (REMINDER, 'reminder.keyword_minutes_before', _NHAC, rf'(?:nhắc|báo)\s*{_PERSON}?\s+(\d+)\s*phút\s+trước'),
+    (REMINDER, 'reminder.before_minutes', ('trước',), r'trước\s+(\d+)\s*phút'),
+    (REMINDER, 'reminder.minutes_before', (DIGIT,), r'(\d+)\s*phút\s+trước'),
+    (REMINDER, 'reminder.leading_keyword', _NHAC, rf'(?:nhắc|báo)\s+{_PERSON}\s+'),
+    (REMINDER, 'reminder.keyword', _NHAC, r'\b(nhắc|báo)\b'),
+
+    # các dạng 'ngày 5 tháng 12' hoặc '5 tháng 12' (có thể có năm)
+    (DATE, 'time.date.month_words', ('ngày', DIGIT), r'(?:ngày\s*)?\d{1,2}\s*tháng\s*\d{1,2}(?:\s*\d{2,4})?'),
+    (DATE, 'time.date.numeric', (DIGIT,), r'(\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?)'),
+    # Prefer matching weekday with week context first (e.g. "thứ bảy tuần sau")
+    (DATE, 'time.date.weekday_week', ('thứ',), r'(thứ\s*(?:\d|hai|ba|tư|năm|sáu|bảy)\b(?:\s+tuần\s+(?:sau|này|tới))?)'),
+    (DATE, 'time.date.weekday', ('thứ', 't', 'chủ', 'cn'), r'(thứ\s*\d|thứ\s+(?:hai|ba|tư|năm|sáu|bảy)|t\d|chủ\s+nhật|cn)\b'),
+    (DATE, 'time.date.relative', ('ngày', 'hôm', 'mai', 'mốt'), r'(ngày\s+mai|hôm\s+nay|mai|ngày\s+kia|mốt)'),
+    (DATE, 'time.date.week', ('tuần',), r'(tuần\s+(?:sau|này|tới))'),
+
+    (TIME, 'time.clock', (DIGIT,), r'(\d{1,2}:\d{2})'),
+    (TIME, 'time.hour_h', (DIGIT,), r'(\d{1,2})h(\d{0,2})(?!\s*trước)'),
+    (TIME, 'time.hour_gio', (DIGIT,), r'(\d{1,2})\s*giờ\s*(\d{0,2})(?!\s*trước)'),
+    (TIME, 'time.hour_g', (DIGIT,), r'(\d{1,2})g(\d{0,2})'),
+    # điều kiện "không có 'giờ' phía sau" được kiểm tra ở time_extractor để span không phụ thuộc phần cuối chuỗi
+    (TIME, 'time.luc_hour', ('lúc',), r'lúc\s+(\d{1,2})\b'),
+
+    (PERIOD, 'time.period', ('tối', 'sáng', 'chiều', 'trưa', 'đêm'), r'\b(tối|sáng|chiều|trưa|đêm)\b'),
+    # detect all-day phrases like 'cả ngày'
+    (PERIOD, 'time.all_day', ('cả',), r'\b(cả\s+ngày)\b'),
+
+    (RANGE, 'time.range', ('từ',), r'từ\s+(.+?)\s+đến\s+(.+?)(?=\s|$)'),
+
+    (LOCATION_PREFIX, 'location.prefix', ('tại', 'ở', 'chỗ', 'nơi'), r'(?:tại|ở|chỗ|nơi)\s+'),
+
+    # Các từ khóa thời gian bị loại khỏi tên sự kiện
+    (FILLER, 'name.time_words', ('vào', 'lúc', 'từ', 'đến', 'ngày', 'thời', 'khoảng', 'này', 'kia'),
+     r'\b(?:vào|lúc|từ|đến|ngày|thời gian|khoảng|này|kia)\b'),
+    (FILLER, 'name.periods', ('sáng', 'chiều', 'tối', 'trưa', 'đêm'), r'\b(?:sáng|chiều|tối|trưa|đêm)\b'),
+    (FILLER, 'name.hom', ('hôm',), r'\b(?:hôm)\b'),
+    (FILLER, 'name.relative_days', ('hôm', 'ngày', 'mai'), r'\b(?:hôm nay|ngày mai|mai)\b'),
+]
+
+# Các từ khóa mà dạng không dấu cũng là một từ thông dụng khác ('cho' khác 'chỗ',
+# 'sang' khác 'sáng', 'tai' khác 'tại'...). Khi người dùng gõ có dấu, các từ này phải
+# đúng dấu mới khớp; khi cả câu gõ không dấu thì mọi từ khóa khớp theo dạng không dấu.
+STRICT_WORDS = frozenset({'sang', 'cho', 'ngay', 'tu', 'tai', 'mot'})
+# Ngay cả khi cả câu không dấu, 'cho' và 'mot' gần như luôn là 'cho' và 'một'
+PLAIN_STRICT_WORDS = frozenset({'cho', 'mot'})
+
+# Các luật không cần phân biệt như trên: từ khóa thời gian bị loại khỏi tên sự kiện
+# (vốn chấp nhận cả dạng không dấu) và cụm 'cả ngày' (ngữ cảnh đã đủ rõ)
+LENIENT_KINDS = frozenset({FILLER})
+LENIENT_RULES = frozenset({'time.all_day'})
+
+
+class FoldedPattern(NamedTuple):
+    # Hai biến thể của cùng một luật: cho văn bản gõ có dấu và văn bản gõ không dấu
+    accented: patterns.TrackedPattern
+    plain: patterns.TrackedPattern
+
+    def pick(self, accented: bool) -> patterns.TrackedPattern:
+        return self.accented if accented else self.plain
+
+
+def compile_folded(name: str, pattern: str, flags: int = re.IGNORECASE, strict: bool = True) -> FoldedPattern:
+    # Compile một luật viết có dấu thành pattern khớp không phân biệt dấu (xem fold_pattern).
+    # strict=False: kể cả khi người dùng gõ có dấu, STRICT_WORDS cũng khớp dạng không dấu.
+    accented = patterns.compile(name, fold_pattern(pattern, STRICT_WORDS if strict else ()), flags)
+    plain_source = fold_pattern(pattern, PLAIN_STRICT_WORDS if strict else ())
+    if plain_source == accented.pattern:
+        return FoldedPattern(accented, accented)
+    return FoldedPattern(accented, patterns.compile(name + '.plain', plain_source, flags))
+
+
+def fold(text: str) -> str:
+    # Bản không dấu cùng độ dài với `text` (ký tự không bỏ dấu được thì giữ nguyên)
+    folded = remove_diacritics(text)
+    if len(folded) != len(text):
+        folded = ''.join(remove_diacritics(c) or c for c in text)
+    return folded
+
+KINDS = [REMINDER, DATE, TIME, PERIOD, RANGE, LOCATION_PREFIX, FILLER]
+
+# Tên luật theo thứ tự ưu tiên của từng loại
+RULES_BY_KIND: Dict[str, List[str]] = {kind: [] for kind in KINDS}
+for _kind, _name, _, _ in RULES:
+    RULES_BY_KIND[_kind].append(_name)
+
+
+# Từ khóa mở đầu (không dấu) -> [(loại, [(tên luật, pattern)])], giữ đúng thứ tự loại và thứ tự ưu tiên.
+# Tách riêng một bảng cho văn bản có dấu (True) và một bảng cho văn bản không dấu (False).
+_DISPATCH: Dict[bool, Dict[str, List[Tuple[str, List[Tuple[str, patterns.TrackedPattern]]]]]] = {True: {}, False: {}}
+for _kind in KINDS:
+    for _rule_kind, _name, _triggers, _pattern in RULES:
+        if _rule_kind != _kind:
+            continue
+        _compiled = compile_folded(_name, _pattern, strict=_kind not in LENIENT_KINDS and _name not in LENIENT_RULES)
+        for _accented, _table in _DISPATCH.items():
+            for _trigger in dict.fromkeys(remove_diacritics(t) for t in _triggers):
+                _by_kind = _table.setdefault(_trigger, [])
+                if not _by_kind or _by_kind[-1][0] != _kind:
+                    _by_kind.append((_kind, []))
+                _by_kind[-1][1].append((_name, _compiled.pick(_accented)))
+
+# Luật có thể khớp xa tùy ý về phía sau ('từ ... đến ...'): khi văn bản được gõ thêm,
+# span của chúng ở phần đầu không đổi vẫn có thể thay đổi (xem Lexed.relex)
+UNBOUNDED_RULES = frozenset({'time.range'})
+_UNBOUNDED_TRIGGERS = sorted({
+    remove_diacritics(t) for _, _name, _triggers, _ in RULES if _name in UNBOUNDED_RULES for t in _triggers
+})
+UNBOUNDED_TOKEN_PATTERN = patterns.compile(
+    'lexer.unbounded_token',
+    r'(?<![^\W\d_])(?:' + '|'.join(map(re.escape, _UNBOUNDED_TRIGGERS)) + r')(?![^\W\d_])',
+    re.IGNORECASE,
+)
+# Các luật còn lại khớp ít hơn số ký tự này (văn bản đã gộp khoảng trắng): span và lần thử
+# bắt đầu sớm hơn chừng ấy ký tự trước chỗ thay đổi không đọc tới phần thay đổi
+RELEX_MARGIN = 64
+_KIND_ORDER = {kind: i for i, kind in enumerate(KINDS)}
+
+# Chỉ dừng ở các "từ" có luật: một dãy chữ số, hoặc một dãy chữ cái trùng với từ mở đầu.
+# Dãy chữ cái phải trọn vẹn (vd. 'mai' trong 'email' không được tính).
+_KEYWORDS = sorted((k for k in _DISPATCH[True] if k != DIGIT), key=len, reverse=True)
+TOKEN_PATTERN = patterns.compile(
+    'lexer.token',
+    r'\d+|(?<![^\W\d_])(?:' + '|'.join(map(re.escape, _KEYWORDS)) + r')(?![^\W\d_])',
+    re.IGNORECASE,
+)
+
+
+class Span(NamedTuple):
+    kind: str
+    rule: str
+    start: int
+    end: int
+    text: str
+    groups: Tuple[Optional[str], ...]
+
+    def group(self, index: int = 0) -> Optional[str]:
+        # Giống re.Match.group: 0 là toàn bộ span, 1..n là các group con của luật
+        if index == 0:
+            return self.text
+        return self.groups[index - 1]
+
+    def shift(self, delta: int) -> 'Span':
+        return self._replace(start=self.start + delta, end=self.end + delta)
+
+
+def _scan(text: str, folded: str, accented: bool, pos: int = 0, stop: Optional[int] = None) -> List[Span]:
+    spans: List[Span] = []
+    dispatch = _DISPATCH[accented]
+    for token in TOKEN_PATTERN.finditer(folded, pos):
+        start = token.start()
+        if stop is not None and start > stop:
+            break
+        word = token.group()
+        candidates = dispatch.get(DIGIT if word[0].isdigit() else word.lower())
+        if not candidates:
+            continue
+        for kind, rules in candidates:
+            for name, pattern in rules:
+                m = pattern.match(text, start)
+                if m:
+                    spans.append(Span(kind, name, start, m.end(), m.group(), m.groups()))
+                    break
+    return spans
+
+
+class Lexed:
+    """Văn bản cùng danh sách span đã tách (sắp theo vị trí bắt đầu).
+
+    `folded` là bản không dấu cùng độ dài với `text`; `accented` cho biết người dùng
+    có gõ dấu hay không (quyết định biến thể luật được dùng, xem STRICT_WORDS).
+    """
+
+    __slots__ = ('text', 'folded', 'accented', 'spans')
+
+    def __init__(self, text: str, folded: str, accented: bool, spans: List[Span]):
+        self.text = text
+        self.folded = folded
+        self.accented = accented
+        self.spans = spans
+
+    def of(self, kind: str) -> List[Span]:
+        return [s for s in self.spans if s.kind == kind]
+
+    def by_rule(self, rule: str) -> List[Span]:
+        return [s for s in self.spans if s.rule == rule]
+
+    def first(self, rule: str) -> Optional[Span]:
+        for s in self.spans:
+            if s.rule == rule:
+                return s
+        return None
+
+    def first_by_priority(self, kind: str) -> Optional[Span]:
+        # Giống việc thử lần lượt từng pattern với re.search: luật ưu tiên trước,
+        # trong cùng luật thì lấy span xuất hiện sớm nhất.
+        best: Optional[Span] = None
+        best_rank = None
+        order = RULES_BY_KIND[kind]
+        for s in self.spans:
+            if s.kind != kind:
+                continue
+            rank = order.index(s.rule)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = s, rank
+        return best
+
+    def cut(self, start: int, end: int) -> 'Lexed':
+        """Xóa đoạn [start, end) khỏi văn bản và dời các span phía sau.
+
+        Chỉ quét lại vùng nhỏ quanh chỗ nối (các span bị cắt ngang), không tách lại toàn bộ chuỗi.
+        """
+        text = self.text
+        left = text[:start]
+        right = text[end:]
+        if not left.strip():
+            skipped = len(right) - len(right.lstrip())
+            left = ''
+        elif not right.strip():
+            skipped = 0
+            left = left.rstrip()
+            right = ''
+        elif left.endswith(' ') and right.startswith(' '):
+            skipped = 1
+        else:
+            skipped = 0
+        new_text = left + right[skipped:]
+        folded = self.folded
+        new_folded = folded[:len(left)] + folded[end + skipped:] if right else folded[:len(left)]
+        delta = len(left) - end - skipped
+
+        # Vùng cần quét lại: từ span sớm nhất chạm vào chỗ cắt tới ngay sau chỗ nối
+        join = len(left)
+        rescan_from = join
+        for s in self.spans:
+            if s.start < start and s.end >= start - 1:
+                rescan_from = min(rescan_from, s.start)
+
+        before: List[Span] = []
+        after: List[Span] = []
+        for s in self.spans:
+            if s.start < rescan_from:
+                before.append(s)
+            elif s.start >= end:
+                shifted = s.shift(delta)
+                if shifted.start > join:
+                    after.append(shifted)
+        rescanned = _scan(new_text, new_folded, self.accented, rescan_from, join)
+        return Lexed(new_text, new_folded, self.accented, before + rescanned + after)
+
+
+    def relex(self, text: str, common: Optional[int] = None) -> 'Lexed':
+        """Tách span cho `text` có chung `common` ký tự đầu với self.text (gõ thêm/sửa ở cuối).
+
+        Giữ các span ở xa chỗ thay đổi, chỉ quét lại từ khoảng RELEX_MARGIN ký tự trước đó;
+        kết quả giống hệt lex(text, self.accented).
+        """
+        if common is None:
+            common = common_prefix(self.text, text)
+        folded = self.folded[:common] + fold(text[common:])
+        # Lùi về đầu một từ để không quét từ giữa một từ
+        rescan_from = text.rfind(' ', 0, max(0, common - RELEX_MARGIN)) + 1
+
+        kept: List[Span] = []
+        for s in self.spans:
+            if s.start >= rescan_from:
+                break
+            # Span của luật không giới hạn chỉ giữ được khi đã kết thúc hẳn trước chỗ thay đổi
+            if s.rule not in UNBOUNDED_RULES or s.end < common:
+                kept.append(s)
+
+        # Thử lại các luật không giới hạn tại từ mở đầu của chúng trong phần giữ lại
+        retried: List[Span] = []
+        if rescan_from:
+            done = {s.start for s in kept if s.rule in UNBOUNDED_RULES}
+            dispatch = _DISPATCH[self.accented]
+            for token in UNBOUNDED_TOKEN_PATTERN.finditer(folded, 0, rescan_from):
+                start = token.start()
+                if start in done:
+                    continue
+                for kind, rules in dispatch[token.group().lower()]:
+                    if not any(name in UNBOUNDED_RULES for name, _ in rules):
+                        continue
+                    # Thử lại cả loại span này tại vị trí đó (luật đứng trước vẫn được ưu tiên)
+                    kept = [s for s in kept if not (s.start == start and s.kind == kind)]
+                    for name, pattern in rules:
+                        m = pattern.match(text, start)
+                        if m:
+                            retried.append(Span(kind, name, start, m.end(), m.group(), m.groups()))
+                            break
+
+        spans = kept + retried
+        if retried:
+            spans.sort(key=lambda s: (s.start, _KIND_ORDER[s.kind]))
+        spans.extend(_scan(text, folded, self.accented, rescan_from))
+        return Lexed(text, folded, self.accented, spans)
+
+
+def common_prefix(a: str, b: str) -> int:
+    # Độ dài phần đầu chung của hai chuỗi (so sánh theo lát cắt, chia đôi)
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def lex(text: str, accented: Optional[bool] = None) -> Lexed:
+    # `accented`: người dùng có gõ dấu không; mặc định suy ra từ chính `text`.
+    # Nên truyền vào giá trị tính trên văn bản gốc, trước khi mở rộng viết tắt.
+    if accented is None:
+        accented = has_diacritics(text)
+    folded = fold(text)
+    return Lexed(text, folded, accented, _scan(text, folded, accented))
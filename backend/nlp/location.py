@@ -1,19 +1,89 @@
-import re
-from typing import Tuple, Optional
-
-def extract_location(text: str) -> Tuple[Optional[str], str]:
-    # Dừng trích xuất location trước các từ khóa thời gian hoặc dấu kết thúc
-    time_lookahead = r"(?:lúc|vào|từ|đến|nhắc|báo|ngày|mai|hôm|mốt|chiều|tối|trưa|sáng|\d{1,2}[:h]|giờ|g)"
-    patterns = [
-        rf'(?:tại|ở|chỗ|nơi)\s+([^,\.\n!?]+?)(?=\s*$|\s+{time_lookahead})',
-        rf'(?:tại|ở|chỗ|nơi)\s+(.+?)(?=\s*$|\s+{time_lookahead})',
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            location = match.group(1).strip()
-            text_clean = text[:match.start()] + text[match.end():]
-            return location, text_clean.strip()
-
-    return None, text
+from typing import List, Tuple, Optional
+
+from nlp import patterns
+from nlp.gazetteer import GAZETTEER
+from nlp.lexer import Lexed, Span, lex, LOCATION_PREFIX, compile_folded
+
+# Dừng trích xuất location trước các từ khóa thời gian hoặc dấu kết thúc.
+# Location giờ được cắt thẳng khỏi văn bản theo vị trí, nên phải dừng cả trước
+# thứ/chủ nhật/tuần, ngày dạng số và cụm "N giờ/tiếng/phút" để không nuốt mất chúng.
+# Từ khóa phải là trọn từ: 'g' không chặn "nhà ga", 'luc' không chặn "Lucky".
+TIME_LOOKAHEAD = (
+    r"(?:(?:lúc|vào|từ|đến|nhắc|báo|ngày|mai|hôm|mốt|chiều|tối|trưa|sáng|thứ|chủ\s+nhật|cn|tuần|t\d|giờ|g)\b"
+    r"|\d{1,2}(?:[:h/-]|\s*(?:giờ|tháng))|\d+\s*(?:tiếng|phút))"
+)
+
+# Location bắt đầu sau một span LOCATION_PREFIX mà lexer đã tìm được và kết thúc ở điểm
+# dừng đầu tiên phía sau: trước một từ khóa thời gian, không có thì ở cuối chuỗi. Điểm dừng
+# được tìm bằng một lần search thay vì regex lười '(.+?)(?=...)' (thử lookahead tại từng ký tự).
+# Từ khóa khớp không phân biệt dấu giống các luật của lexer.
+LOCATION_END = compile_folded('location.end', rf'\s+{TIME_LOOKAHEAD}')
+# Ưu tiên tiền tố có location không vượt qua dấu câu
+LOCATION_PUNCT = patterns.compile('location.punct', r'[,\.\n!?]')
+
+
+def _after_prefix(lexed: Lexed, prefixes: List[Span]) -> Optional[Tuple[Span, int]]:
+    # (tiền tố, vị trí kết thúc location) của tiền tố đầu tiên có location không chứa dấu câu,
+    # nếu không có thì của tiền tố đầu tiên có location trên cùng một dòng
+    text = lexed.text
+    end_pattern = LOCATION_END.pick(lexed.accented)
+    text_end = len(text.rstrip())
+    first = None
+    for prefix in prefixes:
+        start = prefix.end
+        if start >= len(text):
+            continue
+        stop = end_pattern.search(text, start + 1)
+        end = stop.start() if stop else max(start + 1, text_end)
+        if not LOCATION_PUNCT.search(text, start, end):
+            return prefix, end
+        if first is None and text.find('\n', start, end) == -1:
+            first = prefix, end
+    return first
+
+
+def find_location(lexed: Lexed, user_id: Optional[int] = None) -> Optional[Tuple[str, int, int]]:
+    # Trả về (location, start, end) với [start, end) gồm cả tiền tố 'tại', 'ở', 'chỗ', 'nơi'.
+    # Địa điểm đã biết gồm địa điểm chung và location người dùng `user_id` đã lưu.
+    # Gazetteer chỉ dùng quanh một tiền tố: không có tiền tố thì không có location, kể cả
+    # khi câu chứa tên địa điểm đã biết ("Đi Hà Nội" giữ nguyên trong tên sự kiện).
+    prefixes = lexed.of(LOCATION_PREFIX)
+    if not prefixes:
+        return None
+    # Bỏ tiền tố nằm bên trong tên địa điểm đã biết (vd. 'noi' trong "ha noi" không phải 'nơi')
+    known = GAZETTEER.spans(lexed.folded, user_id)
+    if known:
+        prefixes = [p for p in prefixes if not any(start < p.start < end for start, end in known)]
+    found = _after_prefix(lexed, prefixes) if prefixes else None
+    if found is None:
+        return None
+    prefix, end = found
+    # Địa điểm đã biết ngay sau tiền tố thì lấy trọn tên, kể cả khi tên chứa
+    # từ khóa thời gian (vd. 'chợ mai', 'quán cafe sáng')
+    end_known = GAZETTEER.match_at(lexed.folded, prefix.end, user_id)
+    if end_known is not None and end_known > end:
+        end = end_known
+    return lexed.text[prefix.end:end].strip(), prefix.start, end
+
+
+def extract_location(text: str, lexed: Optional[Lexed] = None,
+                     user_id: Optional[int] = None) -> Tuple[Optional[str], str]:
+    if lexed is None:
+        lexed = lex(text)
+    found = find_location(lexed, user_id)
+    if found is None:
+        return None, text
+    location, start, end = found
+    return location, lexed.cut(start, end).text
+
+
+def restore_case(location: str, raw: str) -> str:
+    # Location được tìm trên bản normalized (chữ thường); lấy lại đúng chữ hoa/thường
+    # từ bản raw nếu đoạn tương ứng có mặt nguyên vẹn trong đó.
+    lowered = raw.lower()
+    if len(lowered) != len(raw):
+        return location
+    idx = lowered.find(location)
+    if idx == -1:
+        return location
+    return raw[idx:idx + len(location)]
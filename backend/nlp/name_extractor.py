@@ -1,27 +1,41 @@
-import re
-from typing import Dict
-
-def extract_event_name(text: str, time_info: Dict) -> str:
-    cleaned = text
-
-    for raw_match in time_info.get('raw_matches', []):
-        cleaned = cleaned.replace(raw_match, '')
-
-    # Loại bỏ các từ khóa liên quan tới thời gian; bao gồm các dạng không dấu
-    # để các đầu vào như 'nay' (không dấu) cũng được xử lý.
-    time_keywords = [
-        r'\b(?:vào|lúc|từ|đến|ngày|thời gian|khoảng|này|nay|kia)\b',
-        r'\b(?:sáng|sang|chiều|chieu|tối|toi|trưa|trua|đêm|dem)\b',
-        r'\b(?:hôm|hom)\b',
-        r'\b(?:hôm nay|hom nay|ngày mai|ngay mai|mai)\b'
-    ]
-    for keyword in time_keywords:
-        cleaned = re.sub(keyword, '', cleaned, flags=re.IGNORECASE)
-
-    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+from typing import Dict, Optional
+
+from nlp import patterns
+from nlp.lexer import Lexed, lex, FILLER
+
+WHITESPACE_PATTERN = patterns.compile('name.whitespace', r'\s+')
+# Tên mặc định khi không còn gì sau khi cắt bỏ thời gian/địa điểm
+DEFAULT_EVENT_NAME = 'Lịch trình mới'
+
+
+def extract_event_name(text: str, time_info: Dict, lexed: Optional[Lexed] = None) -> str:
+    if 'matched_spans' not in time_info:
+        # time_info không có vị trí span (vd. dựng tay): xóa theo chuỗi như trước
+        for raw_match in time_info.get('raw_matches', []):
+            text = text.replace(raw_match, '')
+        lexed = None
+    if lexed is None:
+        lexed = lex(text)
+
+    # Cắt bỏ các span thời gian đã dùng và các từ khóa thời gian (span FILLER);
+    # các từ khóa có cả dạng không dấu để các đầu vào như 'nay' cũng được xử lý.
+    removed = list(time_info.get('matched_spans', []))
+    removed.extend((s.start, s.end) for s in lexed.of(FILLER))
+    removed.sort()
+
+    pieces = []
+    last = 0
+    for start, end in removed:
+        if start > last:
+            pieces.append(text[last:start])
+        last = max(last, end)
+    pieces.append(text[last:])
+    cleaned = ' '.join(pieces)
+
+    cleaned = WHITESPACE_PATTERN.sub(' ', cleaned).strip()
     cleaned = cleaned.strip('.,!?;: ')
 
     if cleaned:
         cleaned = cleaned[0].upper() + cleaned[1:]
 
-    return cleaned if cleaned else 'Lịch trình mới'
+    return cleaned if cleaned else DEFAULT_EVENT_NAME
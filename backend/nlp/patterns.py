@@ -0,0 +1,182 @@
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+
+# Registry dùng chung cho toàn bộ regex của package nlp.
+# Mỗi pattern được compile một lần lúc import module và được đặt tên
+# (ví dụ 'time.period', 'reminder.before_hours') để có thể thống kê
+# số lần gọi, số lần khớp và thời gian đã tiêu tốn cho từng luật.
+
+
+class TrackedPattern:
+    """Bọc một `re.Pattern` đã compile, có thể bật/tắt đếm thống kê.
+
+    Khi tắt thống kê, các method search/match/... trỏ thẳng vào method
+    của pattern gốc nên không tốn thêm chi phí gọi hàm.
+    """
+
+    def __init__(self, name: str, pattern: str, flags: int = 0):
+        self.name = name
+        self.pattern = pattern
+        self.flags = flags
+        self.regex = re.compile(pattern, flags)
+        self.calls = 0
+        self.hits = 0
+        self.seconds = 0.0
+        self._bind(False)
+
+    def _bind(self, tracked: bool) -> None:
+        regex = self.regex
+        if not tracked:
+            self.search = regex.search
+            self.match = regex.match
+            self.fullmatch = regex.fullmatch
+            self.finditer = regex.finditer
+            self.findall = regex.findall
+            self.sub = regex.sub
+            self.split = regex.split
+            return
+        self.search = self._tracked_search
+        self.match = self._tracked_match
+        self.fullmatch = self._tracked_fullmatch
+        self.finditer = self._tracked_finditer
+        self.findall = self._tracked_findall
+        self.sub = self._tracked_sub
+        self.split = self._tracked_split
+
+    def _record(self, started: float, hits: int) -> None:
+        self.seconds += time.perf_counter() - started
+        self.calls += 1
+        self.hits += hits
+
+    def _tracked_search(self, string: str, pos: int = 0, endpos: int = sys.maxsize):
+        started = time.perf_counter()
+        m = self.regex.search(string, pos, endpos)
+        self._record(started, 1 if m else 0)
+        return m
+
+    def _tracked_match(self, string: str, pos: int = 0, endpos: int = sys.maxsize):
+        started = time.perf_counter()
+        m = self.regex.match(string, pos, endpos)
+        self._record(started, 1 if m else 0)
+        return m
+
+    def _tracked_fullmatch(self, string: str, pos: int = 0, endpos: int = sys.maxsize):
+        started = time.perf_counter()
+        m = self.regex.fullmatch(string, pos, endpos)
+        self._record(started, 1 if m else 0)
+        return m
+
+    def _tracked_finditer(self, string: str, pos: int = 0, endpos: int = sys.maxsize) -> Iterator[re.Match]:
+        # Duyệt hết ngay để đo được thời gian quét toàn bộ chuỗi
+        started = time.perf_counter()
+        matches = list(self.regex.finditer(string, pos, endpos))
+        self._record(started, len(matches))
+        return iter(matches)
+
+    def _tracked_findall(self, string: str, pos: int = 0, endpos: int = sys.maxsize) -> List[Any]:
+        started = time.perf_counter()
+        found = self.regex.findall(string, pos, endpos)
+        self._record(started, len(found))
+        return found
+
+    def _tracked_sub(self, repl: Any, string: str, count: int = 0) -> str:
+        started = time.perf_counter()
+        out, n = self.regex.subn(repl, string, count)
+        self._record(started, n)
+        return out
+
+    def _tracked_split(self, string: str, maxsplit: int = 0) -> List[str]:
+        started = time.perf_counter()
+        parts = self.regex.split(string, maxsplit)
+        self._record(started, len(parts) - 1)
+        return parts
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.hits = 0
+        self.seconds = 0.0
+
+    def __repr__(self) -> str:
+        return f"TrackedPattern({self.name!r}, {self.pattern!r})"
+
+
+class PatternRegistry:
+    def __init__(self, stats_enabled: bool = False):
+        self._patterns: Dict[str, TrackedPattern] = {}
+        self.stats_enabled = stats_enabled
+
+    def compile(self, name: str, pattern: str, flags: int = 0) -> TrackedPattern:
+        # Đăng ký (hoặc lấy lại) pattern theo tên; tên trùng nhưng nội dung khác là lỗi lập trình
+        existing = self._patterns.get(name)
+        if existing is not None:
+            if existing.pattern != pattern or existing.flags != flags:
+                raise ValueError(f"Pattern '{name}' đã được đăng ký với nội dung khác")
+            return existing
+        tracked = TrackedPattern(name, pattern, flags)
+        if self.stats_enabled:
+            tracked._bind(True)
+        self._patterns[name] = tracked
+        return tracked
+
+    def get(self, name: str) -> TrackedPattern:
+        return self._patterns[name]
+
+    def names(self) -> List[str]:
+        return list(self._patterns)
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def warm(self) -> int:
+        # Import tất cả extractor để mọi pattern đều được compile trước request đầu tiên.
+        # Chạy thử mỗi pattern một lần trên chuỗi rỗng để khởi tạo sẵn bộ máy regex.
+        import nlp.preprocess  # noqa: F401
+        import nlp.lexer  # noqa: F401
+        import nlp.gazetteer  # noqa: F401
+        import nlp.location  # noqa: F401
+        import nlp.reminder  # noqa: F401
+        import nlp.time_extractor  # noqa: F401
+        import nlp.name_extractor  # noqa: F401
+        import nlp.datetime_builder  # noqa: F401
+        import nlp.fallback  # noqa: F401
+        import nlp_processor  # noqa: F401
+
+        for tracked in self._patterns.values():
+            tracked.regex.search('')
+        return len(self._patterns)
+
+    def enable_stats(self, enabled: bool = True) -> None:
+        self.stats_enabled = enabled
+        for tracked in self._patterns.values():
+            tracked._bind(enabled)
+
+    def reset_stats(self) -> None:
+        for tracked in self._patterns.values():
+            tracked.reset()
+
+    def stats(self, top: Optional[int] = None) -> List[Dict[str, Any]]:
+        # Trả về thống kê theo từng pattern, sắp xếp theo tổng thời gian giảm dần
+        rows = [
+            {
+                'name': t.name,
+                'calls': t.calls,
+                'hits': t.hits,
+                'total_ms': round(t.seconds * 1000, 3),
+                'avg_us': round(t.seconds * 1e6 / t.calls, 3) if t.calls else 0.0,
+            }
+            for t in self._patterns.values()
+        ]
+        rows.sort(key=lambda r: r['total_ms'], reverse=True)
+        return rows[:top] if top else rows
+
+
+# Bật thống kê ngay từ đầu bằng biến môi trường NLP_PATTERN_STATS=1
+REGISTRY = PatternRegistry(stats_enabled=os.getenv("NLP_PATTERN_STATS", "0") == "1")
+
+
+def compile(name: str, pattern: str, flags: int = 0) -> TrackedPattern:
+    return REGISTRY.compile(name, pattern, flags)
@@ -1,50 +1,135 @@
-import re
+import os
 import unicodedata
-from typing import Dict
-
-# Bảng viết tắt nhỏ — mở rộng khi cần
-ABBREVIATIONS = {
-    r"\bo\b": 'ở',
-    r"\bphong\b": 'phòng',
-    r"\bph\b": 'phòng',
-    r"\bhop\b": 'họp',
-    r"\bgap\b": 'gặp',
-    r"\bnhom\b": 'nhóm',
-    r"\bluc\b": 'lúc',
-    r"\blk\b": 'lúc',
-    r"\bhn\b": 'hà nội',
-    r"\btp\b": 'thành phố',
-    r"\bg\b": 'giờ',
-    r"\bgio\b": 'giờ',
-    r"\bh\b": 'giờ',
-    r"\bpt\b": 'phút',
-    r"\btoi\b": 'tối',
-    r"\btrua\b": 'trưa',
-
-}
+from pathlib import Path
+from typing import Collection, Dict, List, Optional
+
+from nlp import patterns
+from nlp.trie import WordTrie
+
+# Bảng viết tắt được đọc từ file dữ liệu (mặc định nlp/data/abbreviations.txt,
+# có thể thay bằng biến môi trường NLP_ABBREVIATIONS_FILE) và nạp vào trie một lần
+ABBREVIATIONS_FILE = Path(os.getenv("NLP_ABBREVIATIONS_FILE", Path(__file__).parent / "data" / "abbreviations.txt"))
+
+
+def load_abbreviations(path: Path) -> Dict[str, str]:
+    # Mỗi dòng: <viết tắt><TAB><dạng đầy đủ>; bỏ qua dòng trống và dòng chú thích '#'
+    abbreviations: Dict[str, str] = {}
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split('\t')
+            if len(parts) != 2 or not parts[0].strip() or not parts[1].strip():
+                raise ValueError(f"{path}:{line_no}: dòng viết tắt không hợp lệ: {line!r}")
+            abbreviations[parts[0].strip().lower()] = parts[1].strip()
+    return abbreviations
+
+
+ABBREVIATIONS = load_abbreviations(ABBREVIATIONS_FILE)
+ABBREVIATION_TRIE = WordTrie(ABBREVIATIONS)
+# Từ đầu của các viết tắt nhiều từ: khi chuẩn hóa từng đoạn (nlp/session.py)
+# không được cắt ngay sau những từ này
+ABBREVIATION_HEADS = frozenset(k.split()[0] for k in ABBREVIATIONS if len(k.split()) > 1)
+ABBREVIATION_MAX_WORDS = max((len(k.split()) for k in ABBREVIATIONS), default=1)
+
+LINEBREAK_PATTERN = patterns.compile('preprocess.linebreaks', r"[\t\n\r]+")
+WHITESPACE_PATTERN = patterns.compile('preprocess.whitespace', r"\s+")
+
+
+def _build_fold_table() -> List[Optional[str]]:
+    # Bảng bỏ dấu tính sẵn một lần: mỗi chữ cái Latin có dấu (gồm toàn bộ bảng chữ cái
+    # tiếng Việt dạng dựng sẵn) -> chữ cái ASCII gốc; dấu kết hợp (U+0300–U+036F) bị xóa.
+    # Dùng list đánh chỉ số theo code point (nhanh hơn dict với str.translate);
+    # ký tự nằm ngoài bảng được giữ nguyên.
+    table: List[Optional[str]] = [chr(code) for code in range(0x1F00)]
+    for start, end in ((0x00C0, 0x024F), (0x1E00, 0x1EFF)):
+        for code in range(start, end + 1):
+            base = ''.join(c for c in unicodedata.normalize('NFKD', chr(code)) if not unicodedata.combining(c))
+            if len(base) == 1 and base.isascii() and base.isalpha():
+                table[code] = base
+    table[ord('đ')] = 'd'
+    table[ord('Đ')] = 'D'
+    for code in range(0x0300, 0x0370):
+        table[code] = None
+    return table
+
+
+FOLD_TABLE = _build_fold_table()
 
 
 def remove_diacritics(s: str) -> str:
-    # Loại bỏ dấu Unicode (trả về chuỗi không dấu).
-    nfkd = unicodedata.normalize('NFKD', s)
-    return ''.join([c for c in nfkd if not unicodedata.combining(c)])
+    # Loại bỏ dấu tiếng Việt (kể cả đ -> d) bằng str.translate.
+    # Với văn bản NFC, kết quả có cùng độ dài và cùng vị trí ký tự với đầu vào.
+    if s.isascii():
+        return s
+    return s.translate(FOLD_TABLE)
+
+
+def has_diacritics(s: str) -> bool:
+    # Văn bản có chữ cái mang dấu hay không (người dùng gõ có dấu)
+    return not s.isascii() and remove_diacritics(s) != s
+
+
+def fold_pattern(pattern: str, strict_words: Collection[str] = ()) -> str:
+    # Viết lại một regex để mỗi chữ cái có dấu khớp cả đúng dấu lẫn không dấu,
+    # vd. 'tối' -> 't[ốo]i': 'tối' và 'toi' đều khớp nhưng 'tôi' thì không.
+    # Mỗi dãy chữ cái liền nhau trong pattern được coi là một từ; từ nào có dạng
+    # không dấu nằm trong `strict_words` thì giữ nguyên (phải gõ đúng dấu).
+    # Escape (\s, \d, \b...) được giữ nguyên.
+    out = []
+    i = 0
+    n = len(pattern)
+    in_class = False
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            out.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if c.isalpha():
+            j = i
+            while j < n and pattern[j].isalpha():
+                j += 1
+            word = pattern[i:j]
+            folded = remove_diacritics(word)
+            if folded == word or (not in_class and folded.lower() in strict_words):
+                out.append(word)
+            else:
+                for ch, base in zip(word, folded):
+                    if base == ch:
+                        out.append(ch)
+                    elif in_class:
+                        out.append(ch + base)
+                    else:
+                        out.append(f'[{ch}{base}]')
+            i = j
+            continue
+        if c == '[' and not in_class:
+            in_class = True
+        elif c == ']' and in_class:
+            in_class = False
+        out.append(c)
+        i += 1
+    return ''.join(out)
 
 
 def expand_abbreviations(s: str) -> str:
-    out = s
-    for abbr_re, full in ABBREVIATIONS.items():
-        out = re.sub(abbr_re, full, out, flags=re.IGNORECASE)
-    return out
+    # Mở rộng mọi viết tắt trong một lượt quét (khớp trọn từ, lấy khóa dài nhất)
+    return ABBREVIATION_TRIE.replace(s)
 
 
 def normalize_text(s: str) -> Dict[str, str]:
     if not s:
         return {'raw': '', 'normalized': '', 'no_accents': ''}
+    # Đưa về dạng dựng sẵn (NFC): bàn phím/hệ điều hành có thể gửi chữ có dấu dạng tổ hợp
+    if not s.isascii() and not unicodedata.is_normalized('NFC', s):
+        s = unicodedata.normalize('NFC', s)
     raw = s.strip()
     normalized = raw.lower()
     # Dọn một số ký tự xuống dòng/ khoảng trắng cơ bản
-    normalized = re.sub(r"[\t\n\r]+", ' ', normalized)
-    normalized = re.sub(r"\s+", ' ', normalized)
+    normalized = LINEBREAK_PATTERN.sub(' ', normalized)
+    normalized = WHITESPACE_PATTERN.sub(' ', normalized)
     # Mở rộng các viết tắt đơn giản
     normalized = expand_abbreviations(normalized)
     no_accents = remove_diacritics(normalized)
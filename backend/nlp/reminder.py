@@ -1,34 +1,37 @@
-import re
 from typing import Tuple, Optional
 
-def extract_reminder(text: str) -> Tuple[Optional[int], str]:
-    #Trích xuất thông tin nhắc nhở (phút) và trả về (minutes, cleaned_text).
-    patterns = [
-        r'(?:nhắc|báo)\s*(?:tôi|tui|mình|em|anh|chị)?\s+trước\s+(\d+)\s*(?:tiếng|giờ)',
-        r'(?:nhắc|báo)\s*(?:tôi|tui|mình|em|anh|chị)?\s+(\d+)\s*(?:tiếng|giờ)\s+trước',
-        r'trước\s+(\d+)\s*(?:tiếng|giờ)',
-        r'(\d+)\s*(?:tiếng|giờ)\s+trước',
-        r'(?:nhắc|báo)\s*(?:tôi|tui|mình|em|anh|chị)?\s+trước\s+(\d+)\s*phút',
-        r'(?:nhắc|báo)\s*(?:tôi|tui|mình|em|anh|chị)?\s+(\d+)\s*phút\s+trước',
-        r'trước\s+(\d+)\s*phút',
-        r'(\d+)\s*phút\s+trước',
-    ]
+from nlp.lexer import Lexed, lex, REMINDER
+
+
+def find_reminder(lexed: Lexed) -> Tuple[Optional[int], Optional[Tuple[int, int]]]:
+    # Trả về (minutes, (start, end) của đoạn cần xóa) dựa trên các span REMINDER
+    match = lexed.first_by_priority(REMINDER)
+    if match is None:
+        # Không tìm thấy thông tin nhắc -> không đặt mặc định
+        return None, None
 
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            minutes = int(match.group(1))
-            matched_text = match.group(0).lower()
-            if 'giờ' in matched_text or 'tiếng' in matched_text:
-                minutes *= 60
-            text_clean = text[:match.start()] + text[match.end():]
-            return minutes, text_clean.strip()
+    if match.rule not in ('reminder.leading_keyword', 'reminder.keyword'):
+        minutes = int(match.group(1))
+        # So trên bản không dấu: 'giờ', 'gio', 'tiếng', 'tieng' đều là đơn vị giờ
+        matched_text = lexed.folded[match.start:match.end].lower()
+        if 'gio' in matched_text or 'tieng' in matched_text:
+            minutes *= 60
+        return minutes, (match.start, match.end)
 
     # Nếu chỉ có từ khóa 'nhắc' hoặc 'báo' mà không có số phút cụ thể thì
-    # trả về (None, cleaned_text) để frontend/backends khác có thể quyết định.
-    if re.search(r'\b(nhắc|báo)\b', text, re.IGNORECASE):
-        text_clean = re.sub(r'^\s*(?:nhắc|báo)\s+(?:tôi|tui|em|mình|anh|chị)\s+', '', text, flags=re.IGNORECASE)
-        return None, text_clean
+    # trả về (None, ...) để frontend/backends khác có thể quyết định.
+    # Chỉ xóa cụm 'nhắc tôi' khi nó đứng đầu câu.
+    leading = lexed.first('reminder.leading_keyword')
+    if leading is not None and not lexed.text[:leading.start].strip():
+        return None, (0, leading.end)
+    return None, None
 
-    # Không tìm thấy thông tin nhắc -> không đặt mặc định
-    return None, text
+
+def extract_reminder(text: str, lexed: Optional[Lexed] = None) -> Tuple[Optional[int], str]:
+    #Trích xuất thông tin nhắc nhở (phút) và trả về (minutes, cleaned_text).
+    if lexed is None:
+        lexed = lex(text)
+    minutes, cut = find_reminder(lexed)
+    if cut is None:
+        return minutes, text
+    return minutes, lexed.cut(*cut).text
@@ -0,0 +1,148 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from nlp.lexer import Lexed
+from nlp.preprocess import ABBREVIATION_HEADS, ABBREVIATION_MAX_WORDS
+
+# Phiên parse khi đang gõ (/nlp/parse/incremental). Mỗi phiên nhớ kết quả của lần trước:
+# - phần đầu văn bản đã "đóng băng" cùng bản chuẩn hóa của nó: chuẩn hóa (lower, viết tắt,
+#   bỏ dấu câu, gộp khoảng trắng) chỉ phụ thuộc từng từ, nên phần đầu cắt tại khoảng trắng
+#   được chuẩn hóa một lần và ghép với bản chuẩn hóa của phần đuôi;
+# - kết quả lex của lần trước, để chỉ tách span lại quanh phần thay đổi (Lexed.relex).
+
+# Số phiên giữ cùng lúc và thời gian (giây) một phiên không dùng thì bị xóa
+NLP_SESSION_MAX = int(os.getenv("NLP_SESSION_MAX", "10000"))
+NLP_SESSION_TTL = float(os.getenv("NLP_SESSION_TTL", "600"))
+
+# Số từ cuối luôn được chuẩn hóa lại (từ đang gõ dở và từ ngay trước nó)
+TAIL_WORDS = 2
+
+
+def _join(left: str, right: str) -> str:
+    if not left:
+        return right
+    if not right:
+        return left
+    return left + ' ' + right
+
+
+def _stable_cut(text: str) -> int:
+    # Vị trí ngay sau một khoảng trắng, còn ít nhất TAIL_WORDS từ phía sau, và không có
+    # viết tắt nhiều từ nào có thể bắt đầu trước và kết thúc sau vị trí đó. 0 = không cắt được.
+    end = len(text)
+    for _ in range(TAIL_WORDS):
+        end = text.rfind(' ', 0, end)
+        if end <= 0:
+            return 0
+    while end > 0:
+        before = text[:end].split()[-(ABBREVIATION_MAX_WORDS - 1):] if ABBREVIATION_MAX_WORDS > 1 else []
+        if not any(word.lower() in ABBREVIATION_HEADS for word in before):
+            return end + 1
+        end = text.rfind(' ', 0, end)
+    return 0
+
+
+class ParseSession:
+    __slots__ = ('token', 'user_id', 'lock', 'text', 'frozen_text', 'frozen_norm', 'lexed', 'updates', 'last_used')
+
+    def __init__(self, token: str, user_id: Optional[int] = None):
+        self.token = token
+        # Người dùng đang gõ: location người đó đã lưu được dùng khi trích xuất địa điểm
+        self.user_id = user_id
+        # Các lần gõ của cùng một phiên được xử lý lần lượt
+        self.lock = threading.Lock()
+        self.text = ''
+        self.frozen_text = ''
+        self.frozen_norm = ''
+        self.lexed: Optional[Lexed] = None
+        self.updates = 0
+        self.last_used = time.monotonic()
+
+    def resolve(self, text: Optional[str], append: str = '', delete: int = 0) -> str:
+        # Văn bản hiện tại của phiên: `text` (gửi lại toàn bộ) hoặc bỏ `delete` ký tự cuối
+        # của lần trước rồi nối thêm `append`
+        if text is not None:
+            return text
+        base = self.text
+        if delete:
+            base = base[:max(0, len(base) - delete)]
+        return base + append
+
+    def normalize(self, text: str, normalize: Callable[[str], str]) -> str:
+        # Bản chuẩn hóa của `text`, giống normalize(text), nhưng chỉ chuẩn hóa phần sau
+        # đoạn đầu đã đóng băng (nếu `text` vẫn bắt đầu bằng đoạn đó)
+        if self.frozen_text and text.startswith(self.frozen_text):
+            tail = text[len(self.frozen_text):]
+        else:
+            self.frozen_text = ''
+            self.frozen_norm = ''
+            tail = text
+        working_norm = _join(self.frozen_norm, normalize(tail))
+
+        # Đóng băng thêm phần đuôi, chừa lại vài từ cuối còn đang thay đổi
+        cut = _stable_cut(tail)
+        if cut:
+            self.frozen_norm = _join(self.frozen_norm, normalize(tail[:cut]))
+            self.frozen_text += tail[:cut]
+        self.text = text
+        return working_norm
+
+
+class SessionStore:
+    def __init__(self, maxsize: int = NLP_SESSION_MAX, ttl: float = NLP_SESSION_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._sessions: 'OrderedDict[str, ParseSession]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _expire(self, clock: float) -> None:
+        # Phiên cũ nhất nằm đầu OrderedDict
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_used + self.ttl >= clock:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def create(self, user_id: Optional[int] = None) -> ParseSession:
+        session = ParseSession(secrets.token_urlsafe(16), user_id)
+        with self._lock:
+            self._expire(time.monotonic())
+            self._sessions[session.token] = session
+            self.created += 1
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        return session
+
+    def get(self, token: str) -> Optional[ParseSession]:
+        clock = time.monotonic()
+        with self._lock:
+            self._expire(clock)
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            session.last_used = clock
+            self._sessions.move_to_end(token)
+        return session
+
+    def drop(self, token: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(token, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'active': len(self._sessions),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'created': self.created,
+            'expired': self.expired,
+            'evictions': self.evictions,
+        }
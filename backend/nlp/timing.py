@@ -0,0 +1,91 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# Đo thời gian từng bước của NLPProcessor (preprocess, lex, location, reminder, ...).
+# Mỗi bước giữ một cửa sổ trượt gồm N lần đo gần nhất để tính p50/p95/p99.
+# Khi tắt, process_text không tạo StageTimer nào nên gần như không tốn chi phí.
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    # Nearest-rank percentile trên dãy đã sắp xếp
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class StageTimings:
+    def __init__(self, window: int = 2048, enabled: bool = False):
+        self.window = window
+        self.enabled = enabled
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stages: Dict[str, float]) -> None:
+        # stages: tên bước -> số giây
+        with self._lock:
+            for stage, seconds in stages.items():
+                samples = self._samples.get(stage)
+                if samples is None:
+                    samples = self._samples[stage] = deque(maxlen=self.window)
+                samples.append(seconds)
+                self._counts[stage] = self._counts.get(stage, 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {stage: sorted(samples) for stage, samples in self._samples.items()}
+            counts = dict(self._counts)
+        stages = {}
+        for stage, values in snapshot.items():
+            stages[stage] = {
+                'count': counts.get(stage, 0),
+                'samples': len(values),
+                'p50_ms': round(_percentile(values, 0.50) * 1000, 4),
+                'p95_ms': round(_percentile(values, 0.95) * 1000, 4),
+                'p99_ms': round(_percentile(values, 0.99) * 1000, 4),
+                'mean_ms': round(sum(values) / len(values) * 1000, 4) if values else 0.0,
+                'max_ms': round(values[-1] * 1000, 4) if values else 0.0,
+            }
+        return {'enabled': self.enabled, 'window': self.window, 'stages': stages}
+
+
+class StageTimer:
+    """Đo một lần xử lý: mỗi lần `mark(stage)` ghi thời gian kể từ lần mark trước."""
+
+    __slots__ = ('stages', '_last', '_started')
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._started = self._last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+    def finish(self, timings: Optional[StageTimings] = None) -> Dict[str, float]:
+        # Thêm bước 'total' và ghi vào thống kê chung (nếu được bật)
+        self.stages['total'] = time.perf_counter() - self._started
+        if timings is not None and timings.enabled:
+            timings.record(self.stages)
+        return self.stages
+
+    def as_ms(self) -> Dict[str, float]:
+        return {stage: round(seconds * 1000, 4) for stage, seconds in self.stages.items()}
+
+
+# Bật thu thập ngay từ đầu bằng biến môi trường NLP_TIMING=1
+TIMINGS = StageTimings(
+    window=int(os.getenv("NLP_TIMING_WINDOW", "2048")),
+    enabled=os.getenv("NLP_TIMING", "0") == "1",
+)
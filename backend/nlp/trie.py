@@ -0,0 +1,96 @@
+import re
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Trie ký tự dùng để tìm nhiều từ khóa trong một lượt quét (kiểu Aho-Corasick đơn giản):
+# chỉ bắt đầu dò tại đầu "từ" và chỉ nhận kết quả kết thúc ở ranh giới từ,
+# giống ngữ nghĩa \bkhóa\b của regex. Tại mỗi vị trí lấy khóa dài nhất.
+# Chi phí không phụ thuộc số lượng khóa mà chỉ phụ thuộc độ dài văn bản.
+
+_END = None  # khóa của node lưu giá trị khi một từ khóa kết thúc tại node đó
+
+
+def _is_word_char(c: str) -> bool:
+    # Cùng định nghĩa với \w của re (Unicode)
+    return c.isalnum() or c == '_'
+
+
+class WordTrie:
+    def __init__(self, entries: Optional[Dict[str, Any]] = None):
+        self._root: Dict[Any, Any] = {}
+        self._size = 0
+        self._starts: Optional[re.Pattern] = None
+        if entries:
+            for key, value in entries.items():
+                self.add(key, value)
+
+    def add(self, key: str, value: Any) -> None:
+        # Khóa được so khớp không phân biệt hoa thường
+        key = key.lower()
+        if not key:
+            return
+        if key[0] not in self._root:
+            # Có ký tự mở đầu mới: build lại pattern tìm điểm bắt đầu khi cần
+            self._starts = None
+        node = self._root
+        for c in key:
+            node = node.setdefault(c, {})
+        if _END not in node:
+            self._size += 1
+        node[_END] = value
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _start_pattern(self) -> re.Pattern:
+        # Đầu một từ có ký tự đầu trùng với ký tự đầu của ít nhất một khóa.
+        # Pattern phụ thuộc nội dung trie (thay đổi khi thêm khóa) nên không đăng ký vào nlp.patterns.
+        if self._starts is None:
+            firsts = ''.join(sorted(c for c in self._root if c is not _END))
+            self._starts = re.compile(r'(?<!\w)[' + re.escape(firsts) + ']' if firsts else r'(?!)')
+        return self._starts
+
+    def finditer(self, text: str, pos: int = 0, endpos: Optional[int] = None) -> Iterator[Tuple[int, int, Any]]:
+        # Trả về (start, end, value) của các khóa không chồng nhau, từ trái sang phải
+        n = len(text) if endpos is None else endpos
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Hiếm gặp: lower() làm đổi độ dài chuỗi, so khớp trực tiếp để giữ đúng offset
+            lowered = text
+        root = self._root
+        starts = self._start_pattern()
+        i = pos
+        while True:
+            m = starts.search(lowered, i, n)
+            if m is None:
+                return
+            i = m.start()
+            node = root
+            j = i
+            best_end = -1
+            best_value = None
+            while j < n:
+                node = node.get(lowered[j])
+                if node is None:
+                    break
+                j += 1
+                if _END in node and (j == n or not _is_word_char(lowered[j])):
+                    best_end = j
+                    best_value = node[_END]
+            if best_end < 0:
+                i += 1
+                continue
+            yield i, best_end, best_value
+            i = best_end
+
+    def replace(self, text: str) -> str:
+        # Thay mọi khóa tìm thấy bằng giá trị tương ứng, trong một lượt
+        pieces = []
+        last = 0
+        for start, end, value in self.finditer(text):
+            pieces.append(text[last:start])
+            pieces.append(value)
+            last = end
+        if not pieces:
+            return text
+        pieces.append(text[last:])
+        return ''.join(pieces)
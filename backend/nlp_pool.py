@@ -0,0 +1,207 @@
+import asyncio
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from nlp.gazetteer import GAZETTEER
+from nlp.session import ParseSession
+from nlp_processor import NLPProcessor
+
+# ======= CẤU HÌNH POOL XỬ LÝ NLP =======
+# NLP_WORKERS: số process xử lý song song (0 = theo số CPU, 1 = không dùng process pool)
+NLP_WORKERS = int(os.getenv("NLP_WORKERS", "0")) or (os.cpu_count() or 1)
+# Số câu gửi sang worker trong một lần, giảm chi phí pickle/IPC cho mỗi câu
+NLP_BATCH_CHUNK = int(os.getenv("NLP_BATCH_CHUNK", "64"))
+# Số câu tối đa trong một request batch
+NLP_BATCH_MAX = int(os.getenv("NLP_BATCH_MAX", "5000"))
+# /nlp/parse chạy trên pool "thread" (mặc định, dùng chung cache của processor) hoặc "process"
+NLP_PARSE_POOL = os.getenv("NLP_PARSE_POOL", "thread").lower()
+# Số request NLP tối đa đang chạy + đang chờ (mỗi chunk NLP_BATCH_CHUNK câu của batch/import tính
+# là một); vượt quá thì trả 503 thay vì xếp hàng mãi
+NLP_QUEUE_LIMIT = int(os.getenv("NLP_QUEUE_LIMIT", "64"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_thread_executor: Optional[ThreadPoolExecutor] = None
+
+# Chỉ được đọc/ghi trên thread của event loop nên không cần lock
+_pending = 0
+_rejected = 0
+
+
+class PoolSaturated(Exception):
+    # Hàng đợi NLP đã đầy (NLP_QUEUE_LIMIT)
+    pass
+
+
+# Mỗi worker process giữ một NLPProcessor riêng
+_worker_processor: Optional[NLPProcessor] = None
+# Processor của process API, dùng chung cho mọi việc chạy trên thread pool (/nlp/parse, batch và
+# import khi NLP_WORKERS=1) để các request dùng chung một cache kết quả parse
+_shared_processor: Optional[NLPProcessor] = None
+
+
+def get_processor() -> NLPProcessor:
+    global _shared_processor
+    if _shared_processor is None:
+        _shared_processor = NLPProcessor()
+    return _shared_processor
+
+
+def _init_worker():
+    global _worker_processor
+    from nlp.patterns import REGISTRY
+
+    _worker_processor = NLPProcessor()
+    REGISTRY.warm()
+
+
+def _process_chunk(texts: List[str], now: Optional[datetime] = None, user_id: Optional[int] = None,
+                   learned: Optional[Tuple[int, List[str]]] = None) -> List[Dict[str, Any]]:
+    # Chạy trong worker process (hoặc thread khi NLP_WORKERS=1).
+    # `learned`: (phiên bản, location) người dùng đã lưu, lấy từ process chính lúc gửi job;
+    # worker chỉ nạp lại khi phiên bản khác bản nó đang giữ
+    if learned is not None:
+        GAZETTEER.sync(user_id, *learned)
+    processor = _worker_processor or get_processor()
+    return [processor.process_text(text, now=now, user_id=user_id) for text in texts]
+
+
+def start_pool(workers: Optional[int] = None) -> Optional[ProcessPoolExecutor]:
+    global _executor, NLP_WORKERS
+    if workers is not None:
+        NLP_WORKERS = max(1, int(workers))
+
+    if _executor is not None or NLP_WORKERS <= 1:
+        return _executor
+
+    _executor = ProcessPoolExecutor(max_workers=NLP_WORKERS, initializer=_init_worker)
+    print(f"[nlp] Process pool bắt đầu với {NLP_WORKERS} worker")
+    return _executor
+
+
+def stop_pool():
+    global _executor, _thread_executor
+    if _executor:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        print("[nlp] Process pool dừng")
+    if _thread_executor:
+        _thread_executor.shutdown(wait=False, cancel_futures=True)
+        _thread_executor = None
+
+
+def _get_thread_executor() -> ThreadPoolExecutor:
+    global _thread_executor
+    if _thread_executor is None:
+        _thread_executor = ThreadPoolExecutor(max_workers=NLP_WORKERS, thread_name_prefix="nlp")
+    return _thread_executor
+
+
+@contextmanager
+def _slot(count: int = 1):
+    # Giữ `count` chỗ trong hàng đợi NLP trong suốt thời gian xử lý request (batch giữ một chỗ
+    # cho mỗi chunk). Batch lớn hơn cả hàng đợi chỉ chạy được khi hàng đợi trống.
+    global _pending, _rejected
+    count = max(1, min(count, NLP_QUEUE_LIMIT))
+    if _pending + count > NLP_QUEUE_LIMIT:
+        _rejected += 1
+        raise PoolSaturated(f"NLP queue is full ({_pending} of {NLP_QUEUE_LIMIT} pending)")
+    _pending += count
+    try:
+        yield
+    finally:
+        _pending -= count
+
+
+def pool_stats() -> Dict[str, Any]:
+    return {
+        "parse_pool": NLP_PARSE_POOL,
+        "workers": NLP_WORKERS,
+        "process_pool_started": _executor is not None,
+        "pending": _pending,
+        "queue_limit": NLP_QUEUE_LIMIT,
+        "rejected": _rejected,
+    }
+
+
+def _chunks(texts: List[str]) -> List[List[str]]:
+    # Chia đều cho các worker, mỗi phần không quá NLP_BATCH_CHUNK câu
+    size = max(1, min(NLP_BATCH_CHUNK, math.ceil(len(texts) / NLP_WORKERS)))
+    return [texts[i:i + size] for i in range(0, len(texts), size)]
+
+
+async def process_one(processor: NLPProcessor, text: str, trace: bool = False,
+                      user_id: Optional[int] = None) -> Dict[str, Any]:
+    # Parse một câu ngoài event loop. Ném PoolSaturated khi hàng đợi đã đầy.
+    # Request có trace luôn chạy trên thread pool với processor truyền vào.
+    with _slot():
+        loop = asyncio.get_running_loop()
+        if trace:
+            return await loop.run_in_executor(
+                _get_thread_executor(), partial(processor.process_text, text, trace=True, user_id=user_id)
+            )
+        if NLP_PARSE_POOL == "process":
+            executor = start_pool()
+            if executor is not None:
+                try:
+                    return (await loop.run_in_executor(
+                        executor, _process_chunk, [text], None, user_id, GAZETTEER.export(user_id)
+                    ))[0]
+                except BrokenProcessPool:
+                    stop_pool()
+                    raise
+        return await loop.run_in_executor(
+            _get_thread_executor(), partial(processor.process_text, text, user_id=user_id)
+        )
+
+
+async def process_preview(processor: NLPProcessor, session: ParseSession, text: Optional[str] = None,
+                          append: str = "", delete: int = 0) -> Dict[str, Any]:
+    # Parse khi đang gõ (xem NLPProcessor.preview) trên thread pool: phiên nằm trong bộ nhớ
+    # của process API nên không gửi sang process pool. Ném PoolSaturated khi hàng đợi đã đầy.
+    with _slot():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _get_thread_executor(), partial(processor.preview, session, text, append, delete)
+        )
+
+
+async def process_batch(texts: List[str], now: Optional[datetime] = None,
+                        user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    # Xử lý danh sách câu ngoài event loop; kết quả giữ đúng thứ tự đầu vào.
+    # Mỗi chunk của batch chiếm một chỗ trong hàng đợi NLP (ném PoolSaturated khi không đủ chỗ).
+    # Mọi câu dùng chung một thời điểm tham chiếu `now` (mặc định: lúc gọi).
+    # Location người dùng `user_id` đã lưu được gửi kèm từng job sang worker process.
+    if not texts:
+        return []
+    if now is None:
+        now = datetime.now()
+
+    chunks = _chunks(texts)
+    with _slot(len(chunks)):
+        loop = asyncio.get_running_loop()
+        executor = start_pool()
+        if executor is None:
+            # NLP_WORKERS=1: chạy trong thread pool để không chặn event loop
+            return await loop.run_in_executor(_get_thread_executor(), _process_chunk, texts, now, user_id)
+
+        learned = GAZETTEER.export(user_id)
+        futures = [
+            loop.run_in_executor(executor, _process_chunk, chunk, now, user_id, learned) for chunk in chunks
+        ]
+        try:
+            parts = await asyncio.gather(*futures)
+        except BrokenProcessPool:
+            # Một worker bị chết (OOM, bị kill...): bỏ pool cũ để request sau tạo lại
+            stop_pool()
+            raise
+
+    results: List[Dict[str, Any]] = []
+    for part in parts:
+        results.extend(part)
+    return results
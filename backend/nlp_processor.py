@@ -1,63 +1,128 @@
-import re
+import os
+from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, Tuple
 
-from nlp.reminder import extract_reminder
-from nlp.location import extract_location
+from nlp import patterns
+from nlp.cache import ParseCache
+from nlp.timing import TIMINGS, StageTimer
+from nlp.lexer import Lexed, lex, compile_folded
+from nlp.reminder import find_reminder
+from nlp.location import find_location, restore_case
 from nlp.time_extractor import extract_time
 from nlp.name_extractor import extract_event_name
 from nlp.datetime_builder import build_datetime
-from nlp.preprocess import normalize_text
+from nlp.fallback import FALLBACK, NLP_FALLBACK_THRESHOLD, score_confidence
+from nlp.gazetteer import GAZETTEER
+from nlp.preprocess import has_diacritics, normalize_text
+from nlp.session import ParseSession
+
+# Loại bỏ một số dấu câu để regex hoạt động dễ dàng hơn
+PUNCTUATION_PATTERN = patterns.compile('processor.punctuation', r"[.,;!?\"']")
+WHITESPACE_PATTERN = patterns.compile('processor.whitespace', r"\s+")
+# Từ đi kèm cụm ngày tương đối mà dateparser trả về ('sau 2 tuần', '2 tuần nữa', 'khoảng 3 ngày sau'):
+# bị bỏ khỏi tên sự kiện cùng với cụm đó
+RELATIVE_BEFORE_PATTERN = compile_folded(
+    'processor.relative_before', r'(?:\b(?:khoảng|tầm|chừng|trong|sau|còn)\s+)+$', strict=False
+)
+RELATIVE_AFTER_PATTERN = compile_folded('processor.relative_after', r'\s+(?:nữa|sau|tới)\b', strict=False)
+
+# Số kết quả parse được cache (0 = tắt) và thời gian sống của mỗi kết quả (giây)
+NLP_CACHE_SIZE = int(os.getenv("NLP_CACHE_SIZE", "2048"))
+NLP_CACHE_TTL = float(os.getenv("NLP_CACHE_TTL", "3600"))
 
 
 class NLPProcessor:
-    def process_text(self, text: str) -> Dict[str, Any]:
-        try:
-            original_text = text
+    def __init__(self, cache_size: Optional[int] = None, cache_ttl: Optional[float] = None,
+                 fallback: Optional[bool] = None, fallback_threshold: Optional[float] = None):
+        # Cache kết quả parse theo (văn bản chuẩn hóa, ngày, giờ:phút nếu cần); 0 = tắt
+        self.cache = ParseCache(
+            NLP_CACHE_SIZE if cache_size is None else cache_size,
+            NLP_CACHE_TTL if cache_ttl is None else cache_ttl,
+        )
+        # Gọi dateparser khi độ tin cậy của regex thấp hơn ngưỡng (mặc định theo NLP_FALLBACK*)
+        self.fallback = FALLBACK.enabled if fallback is None else fallback
+        self.fallback_threshold = NLP_FALLBACK_THRESHOLD if fallback_threshold is None else fallback_threshold
 
+    def process_text(self, text: str, trace: bool = False, now: Optional[datetime] = None,
+                     user_id: Optional[int] = None) -> Dict[str, Any]:
+        # trace=True: bỏ qua cache và trả thêm result['trace'] gồm thời gian từng bước
+        # và các span đã khớp. Thời gian từng bước chỉ được đo khi trace hoặc TIMINGS bật.
+        # `now`: thời điểm tham chiếu cho 'mai', 'thứ 6'... (mặc định là lúc gọi)
+        # `user_id`: người dùng có các location đã lưu được dùng khi trích xuất địa điểm
+        timer = StageTimer() if (trace or TIMINGS.enabled) else None
+        try:
             # Tiền xử lý: tạo bản chuẩn hóa (lower/no-accent) và bản raw
             pre = normalize_text(text)
-            working_norm = pre.get('normalized')
-            # Loại bỏ một số dấu câu để regex hoạt động dễ dàng hơn
-            working_norm = re.sub(r"[.,;!?\"']", '', working_norm)
-
-            # Trích xuất location từ bản raw (giữ nguyên chữ hoa/chữ thường)
-            raw_for_location = re.sub(r"[.,;!?\"']", '', pre.get('raw'))
-            location, _ = extract_location(raw_for_location)
-            # Nếu tìm thấy location, loại bỏ cụm đó khỏi bản normalized để tránh ảnh hưởng tới trích xuất thời gian
-            if location:
-                # Khi loại location khỏi bản normalized, xóa luôn tiền tố như 'tại', 'ở', 'chỗ', 'nơi'
-                # để tránh còn lại từ như 'tại' trong event_name.
-                try:
-                    prefix_pattern = r"(?:\b(?:tại|ở|chỗ|nơi)\b\s*)?"
-                    pattern = rf"{prefix_pattern}{re.escape(location.lower())}"
-                    working_norm = re.sub(pattern, '', working_norm, flags=re.IGNORECASE)
-                except Exception:
-                    # Fallback: xóa location và sau đó loại tiền tố chung nếu còn
-                    working_norm = working_norm.replace(location.lower(), '')
-                    working_norm = re.sub(r"(?:\b(?:tại|ở|chỗ|nơi)\b\s*)", '', working_norm, flags=re.IGNORECASE)
-                working_norm = re.sub(r"\s+", ' ', working_norm).strip()
-
-            # Trích xuất reminder và phần còn lại dựa trên bản normalized
-            minutes, text_no_reminder = extract_reminder(working_norm)
-            time_info = extract_time(text_no_reminder)
-            event_name = extract_event_name(text_no_reminder, time_info)
-
-            # Xây dựng datetime — nếu có ngày không hợp lệ, build_datetime sẽ ném ValueError và ta báo về người dùng
-            try:
-                start_dt, end_dt = build_datetime(time_info)
-            except ValueError as e:
-                return {'error': str(e), 'success': False}
-
-            # Tập hợp kết quả trả về dưới dạng dict chuẩn
-            result = {
-                'event_name': event_name,
-                'start_time': start_dt.strftime('%Y-%m-%d %H:%M:%S'),
-                'end_time': end_dt.strftime('%Y-%m-%d %H:%M:%S') if end_dt else None,
-                'location': location,
-                'time_reminder': minutes,
-                'success': True
-            }
+            working_norm = self._working_text(pre.get('normalized'))
+
+            # Người dùng có gõ dấu hay không (xét trên bản raw, trước khi mở rộng viết tắt)
+            accented = has_diacritics(pre.get('raw'))
+            if timer:
+                timer.mark('preprocess')
+
+            if now is None:
+                now = datetime.now()
+            # Phiên bản location đã học của người dùng: khi học thêm, kết quả cũ trong cache không còn dùng
+            key = (working_norm, accented, GAZETTEER.version(user_id))
+            spans = [] if trace else None
+            result = None if trace else self.cache.get(key, now)
+            if timer:
+                timer.mark('cache')
+            if result is None:
+                result, depends_on_clock = self._parse(working_norm, accented, now, timer, spans, user_id=user_id)
+                if not trace:
+                    self.cache.put(key, now, result, depends_on_clock)
+
+            # Location được tìm trên bản normalized; lấy lại chữ hoa/chữ thường từ bản raw
+            self._restore_location(result, pre.get('raw'))
+            if timer:
+                timer.mark('postprocess')
+                timer.finish(TIMINGS)
+                if trace:
+                    result['trace'] = {
+                        'normalized': working_norm,
+                        'accented': accented,
+                        'stages_ms': timer.as_ms(),
+                        'spans': spans,
+                    }
+
+            return result
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return {'error': f'Không thể xử lý: {str(e)}', 'success': False}
 
+    def preview(self, session: ParseSession, text: Optional[str] = None,
+                append: str = '', delete: int = 0, now: Optional[datetime] = None) -> Dict[str, Any]:
+        # Parse khi người dùng đang gõ: văn bản mới là `text`, hoặc văn bản lần trước bỏ `delete`
+        # ký tự cuối rồi nối `append`. Dùng lại bản chuẩn hóa của phần đầu không đổi và các span
+        # của lần trước trong cùng phiên, chỉ xử lý lại phần đuôi. Không dùng cache
+        # (mỗi lần gõ là một chuỗi mới, chỉ làm đẩy các kết quả có ích ra khỏi cache).
+        timer = StageTimer() if TIMINGS.enabled else None
+        try:
+            with session.lock:
+                text = session.resolve(text, append, delete)
+                working_norm = session.normalize(text, self._normalize_segment)
+                accented = has_diacritics(text)
+                if timer:
+                    timer.mark('preprocess')
+
+                previous = session.lexed
+                if previous is not None and previous.accented == accented:
+                    lexed = previous.relex(working_norm)
+                else:
+                    lexed = lex(working_norm, accented)
+                session.lexed = lexed
+                session.updates += 1
+
+            # Câu đang gõ dở thường có độ tin cậy thấp: không gọi dateparser cho mỗi lần gõ
+            result, _ = self._parse(working_norm, accented, now or datetime.now(), timer, lexed=lexed,
+                                    fallback=False, user_id=session.user_id)
+            self._restore_location(result, text.strip())
+            if timer:
+                timer.mark('postprocess')
+                timer.finish(TIMINGS)
             return result
 
         except Exception as e:
@@ -65,5 +130,132 @@ class NLPProcessor:
             traceback.print_exc()
             return {'error': f'Không thể xử lý: {str(e)}', 'success': False}
 
+    @staticmethod
+    def _working_text(normalized: str) -> str:
+        # Bỏ dấu câu và gộp khoảng trắng trên bản đã chuẩn hóa
+        working_norm = PUNCTUATION_PATTERN.sub('', normalized)
+        return WHITESPACE_PATTERN.sub(' ', working_norm).strip()
+
+    def _normalize_segment(self, text: str) -> str:
+        return self._working_text(normalize_text(text).get('normalized'))
+
+    @staticmethod
+    def _restore_location(result: Dict[str, Any], raw: str) -> None:
+        if result.get('location'):
+            raw_for_location = WHITESPACE_PATTERN.sub(' ', PUNCTUATION_PATTERN.sub('', raw))
+            result['location'] = restore_case(result['location'], raw_for_location)
+
+    def _parse(self, working_norm: str, accented: bool, now: datetime,
+               timer: Optional[StageTimer] = None, spans: Optional[list] = None,
+               lexed: Optional[Lexed] = None, fallback: bool = True,
+               user_id: Optional[int] = None) -> Tuple[Dict[str, Any], bool]:
+        # Trả về (kết quả, kết quả có phụ thuộc giờ:phút hiện tại hay không).
+        # `spans` (nếu có) nhận danh sách span đã khớp, dùng cho trace.
+        # `lexed` (nếu có) là kết quả lex(working_norm, accented) đã tách sẵn.
+        # fallback=False: không gọi dateparser kể cả khi độ tin cậy thấp.
+        # `user_id`: người dùng có các location đã lưu được dùng khi trích xuất địa điểm.
+
+        # Tách span một lượt trên bản normalized; các bước sau chỉ làm việc trên span
+        if lexed is None:
+            lexed = lex(working_norm, accented)
+        if spans is not None:
+            spans.extend(
+                {'kind': s.kind, 'rule': s.rule, 'start': s.start, 'end': s.end, 'text': s.text}
+                for s in lexed.spans
+            )
+        if timer:
+            timer.mark('lex')
+
+        location = None
+        found = find_location(lexed, user_id)
+        # Nếu tìm thấy location, loại bỏ cụm đó (kèm tiền tố như 'tại', 'ở', 'chỗ', 'nơi')
+        # để tránh ảnh hưởng tới trích xuất thời gian và event_name.
+        if found:
+            location, start, end = found
+            lexed = lexed.cut(start, end)
+        if timer:
+            timer.mark('location')
+
+        # Trích xuất reminder và phần còn lại dựa trên bản normalized
+        minutes, reminder_cut = find_reminder(lexed)
+        if reminder_cut:
+            lexed = lexed.cut(*reminder_cut)
+        if timer:
+            timer.mark('reminder')
+        time_info = extract_time(lexed.text, lexed)
+        if timer:
+            timer.mark('time')
+        event_name = extract_event_name(lexed.text, time_info, lexed)
+        if timer:
+            timer.mark('name')
+
+        # Xây dựng datetime — nếu có ngày không hợp lệ, build_datetime sẽ ném ValueError và ta báo về người dùng
+        try:
+            start_dt, end_dt = build_datetime(time_info, now)
+        except ValueError as e:
+            return {'error': str(e), 'success': False}, False
+        if timer:
+            timer.mark('datetime')
+
+        # Độ tin cậy của pipeline regex; thấp thì thử dateparser trên phần còn lại của câu
+        confidence = score_confidence(time_info, event_name)
+        parser = 'regex'
+        if fallback and self.fallback and confidence < self.fallback_threshold and FALLBACK.enabled:
+            found = FALLBACK.search(lexed.text, now)
+            if found:
+                start_dt, end_dt, event_name = self._merge_fallback(
+                    found, time_info, start_dt, end_dt, event_name, now, lexed
+                )
+                parser = 'dateparser'
+            if timer:
+                timer.mark('fallback')
+
+        # Tập hợp kết quả trả về dưới dạng dict chuẩn
+        result = {
+            'event_name': event_name,
+            'start_time': start_dt.strftime('%Y-%m-%d %H:%M:%S'),
+            'end_time': end_dt.strftime('%Y-%m-%d %H:%M:%S') if end_dt else None,
+            'location': location,
+            'time_reminder': minutes,
+            'confidence': confidence,
+            'parser': parser,
+            'success': True
+        }
+
+        # Sự kiện rơi vào hôm nay có thể bị dời sang ngày mai khi giờ đã qua,
+        # nên kết quả cho hôm nay/ngày mai chỉ đúng trong phút hiện tại
+        depends_on_clock = start_dt.date() <= now.date() + timedelta(days=1)
+        return result, depends_on_clock
 
+    @staticmethod
+    def _merge_fallback(found: Tuple[str, datetime], time_info: Dict[str, Any], start_dt: datetime,
+                        end_dt: Optional[datetime], event_name: str,
+                        now: datetime, lexed: Lexed) -> Tuple[datetime, Optional[datetime], str]:
+        # Ghép kết quả dateparser vào kết quả regex: lấy ngày từ dateparser; giờ giữ của regex
+        # nếu regex đã tìm thấy, không thì lấy giờ của dateparser — trừ 00:00 (chỉ có ngày) và
+        # giờ hiện tại (cụm tương đối như 'sau 2 tuần' giữ nguyên giờ của thời điểm tham chiếu).
+        phrase, value = found
+        if time_info.get('time_start') or (value.hour, value.minute) in ((0, 0), (now.hour, now.minute)):
+            candidate = datetime.combine(value.date(), start_dt.time())
+        else:
+            candidate = value.replace(second=0, microsecond=0)
+        if candidate < now:
+            return start_dt, end_dt, event_name
+        if end_dt:
+            end_dt += candidate - start_dt
 
+        # Tách lại tên sự kiện từ phần văn bản không thuộc cụm dateparser đã dùng,
+        # kể cả các từ đi kèm cụm đó ('sau', 'nữa'...)
+        text = lexed.text
+        start = text.lower().find(phrase.lower())
+        if start >= 0:
+            end = start + len(phrase)
+            before = RELATIVE_BEFORE_PATTERN.pick(lexed.accented).search(text, 0, start)
+            after = RELATIVE_AFTER_PATTERN.pick(lexed.accented).match(text, end)
+            if before:
+                start = before.start()
+            if after:
+                end = after.end()
+            used = dict(time_info, matched_spans=time_info.get('matched_spans', []) + [(start, end)])
+            event_name = extract_event_name(text, used, lexed)
+        return candidate, end_dt, event_name
@@ -91,7 +91,11 @@ def _get_pending_reminders(session: Session, window_start: datetime, window_end:
     #Lấy danh sách event cần gửi reminder trong khoảng (window_start, window_end].
     #Điều này tránh gửi reminder "sớm" nếu job quét với tần suất lớn hơn 1s,
     #và đảm bảo reminder chỉ được gửi nếu reminder_time nằm trong cửa sổ quét gần nhất.
-    stmt = select(Event).where(Event.time_reminder != None, Event.reminder_sent_at == None)
+    # reminder_time <= start_time (nhắc trước giờ bắt đầu) nên chỉ cần các sự kiện bắt đầu sau
+    # window_start; cùng điều kiện chưa gửi, truy vấn chỉ quét index ix_events_reminder_pending
+    stmt = select(Event).where(
+        Event.time_reminder != None, Event.reminder_sent_at == None, Event.start_time > window_start
+    )
     events = session.exec(stmt).all()
 
     pending: List[Dict[str, Any]] = []
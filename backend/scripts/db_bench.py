@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlmodel import SQLModel
+
+# Thêm thư mục cha (backend) vào sys.path để import module nội bộ
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db import PROFILES, make_engine
+from migrations import run_migrations
+
+# Benchmark đọc/ghi đồng thời trên SQLite cho từng profile trong db.PROFILES (cùng cấu hình mặc định
+# cũ của SQLite - journal rollback, không busy_timeout - để so sánh). Mỗi profile chạy trên một file
+# database tạm riêng: nhiều thread đọc (một trang lịch tháng của một user) và nhiều thread ghi
+# (thêm một sự kiện mỗi transaction) trong cùng khoảng thời gian.
+
+BASE = datetime(2026, 1, 1)
+READ_SQL = text(
+    "SELECT * FROM events WHERE user_id = :user AND start_time >= :start AND start_time < :end "
+    "ORDER BY start_time, id LIMIT 100"
+)
+WRITE_SQL = text(
+    "INSERT INTO events (user_id, event_name, start_time, location, reminder_sent, created_at) "
+    "VALUES (:user, :name, :start, :location, 0, :created)"
+)
+
+
+def _event_params(rnd, users):
+    start = BASE + timedelta(minutes=rnd.randint(0, 365 * 24 * 60))
+    return {
+        'user': rnd.randint(1, users),
+        'name': f'Sự kiện {rnd.randint(0, 10 ** 6)}',
+        'start': start.strftime('%Y-%m-%d %H:%M:%S.%f'),
+        'location': rnd.choice([None, 'Văn Phòng Khoa', 'Thư viện']),
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'),
+    }
+
+
+def _seed(engine, rows, users, seed):
+    SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
+    rnd = random.Random(seed)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, email, password, created_at) "
+                          "VALUES (:id, :u, :e, 'x', :created)"),
+                     [{'id': i, 'u': f'user{i}', 'e': f'user{i}@example.com', 'created': str(BASE)}
+                      for i in range(1, users + 1)])
+        conn.execute(WRITE_SQL, [_event_params(rnd, users) for _ in range(rows)])
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_profile(name, args):
+    directory = tempfile.mkdtemp(prefix='db_bench_')
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    if name == 'default':
+        engine = create_engine(url, connect_args={'check_same_thread': False})
+    else:
+        engine = make_engine(url, profile=name, echo=False)
+    _seed(engine, args.rows, args.users, args.seed)
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {'reads': 0, 'writes': 0, 'errors': 0, 'write_ms': [], 'read_ms': []}
+
+    def reader(i):
+        rnd = random.Random(args.seed * 1000 + i)
+        reads, latencies, errors = 0, [], 0
+        while not stop.is_set():
+            month = rnd.randint(1, 12)
+            start = datetime(2026, month, 1)
+            params = {'user': rnd.randint(1, args.users), 'start': str(start),
+                      'end': str(start + timedelta(days=31))}
+            began = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(READ_SQL, params).fetchall()
+                reads += 1
+                latencies.append((time.perf_counter() - began) * 1000)
+            except Exception:
+                errors += 1
+        with lock:
+            stats['reads'] += reads
+            stats['read_ms'] += latencies
+            stats['errors'] += errors
+
+    def writer(i):
+        rnd = random.Random(args.seed * 2000 + i)
+        writes, latencies, errors = 0, [], 0
+        while not stop.is_set():
+            began = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    conn.execute(WRITE_SQL, _event_params(rnd, args.users))
+                writes += 1
+                latencies.append((time.perf_counter() - began) * 1000)
+            except Exception:
+                # "database is locked": không chờ được khóa ghi
+                errors += 1
+        with lock:
+            stats['writes'] += writes
+            stats['write_ms'] += latencies
+            stats['errors'] += errors
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'profile': name,
+        'reads_per_s': round(stats['reads'] / args.duration, 1),
+        'writes_per_s': round(stats['writes'] / args.duration, 1),
+        'read_p99_ms': round(_percentile(stats['read_ms'], 0.99), 2),
+        'write_p99_ms': round(_percentile(stats['write_ms'], 0.99), 2),
+        'errors': stats['errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark đọc/ghi đồng thời SQLite theo profile của db.py")
+    parser.add_argument("--profiles", default=','.join(['default', *PROFILES]),
+                        help="các profile cần đo, cách nhau dấu phẩy ('default' = cấu hình mặc định của SQLite)")
+    parser.add_argument("--rows", type=int, default=50000, help="số sự kiện có sẵn trong database")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--readers", type=int, default=4, help="số thread đọc")
+    parser.add_argument("--writers", type=int, default=2, help="số thread ghi")
+    parser.add_argument("--duration", type=float, default=5.0, help="thời gian đo mỗi profile (giây)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'profile':<10}{'reads/s':>10}{'writes/s':>10}{'read p99':>11}{'write p99':>11}{'errors':>8}")
+    for name in args.profiles.split(','):
+        result = run_profile(name.strip(), args)
+        results.append(result)
+        print(f"{result['profile']:<10}{result['reads_per_s']:>10}{result['writes_per_s']:>10}"
+              f"{result['read_p99_ms']:>9}ms{result['write_p99_ms']:>9}ms{result['errors']:>8}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
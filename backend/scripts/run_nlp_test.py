@@ -1,11 +1,22 @@
 import sys
 import os
+import io
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import re
 
 # Thêm thư mục cha (backend) vào sys.path để import module nội bộ
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from nlp_processor import NLPProcessor
+from nlp.gazetteer import GAZETTEER
+from nlp.session import ParseSession
 
 def normalize_text(text):
     """Chuẩn hóa text để so sánh (bỏ qua hoa thường và khoảng trắng thừa)"""
@@ -52,6 +63,13 @@ if days_until_sunday == 0:
 else:
     this_sunday = now + timedelta(days=days_until_sunday)
 
+def next_date(month, day):
+    # Ngày month/day gần nhất chưa qua (giống datetime_builder: đã qua thì sang năm sau)
+    candidate = now.replace(month=month, day=day)
+    if candidate.date() < now.date():
+        candidate = candidate.replace(year=now.year + 1)
+    return candidate
+
 # Danh sách test cases với expected results thực tế
 testcases = [
     {
@@ -356,23 +374,146 @@ testcases = [
     }
 ]
 
+# Các câu từng bị hồi quy (fallback dateparser, gazetteer địa điểm, ranh giới từ khóa). Chạy cùng
+# testcases nhưng không dùng để sinh corpus benchmark, để corpus giữ nguyên giữa các lần đo.
+regression_testcases = [
+    # Ngày tương đối do dateparser tìm (độ tin cậy của regex thấp): cả cụm 'sau/khoảng ... nữa'
+    # phải bị bỏ khỏi tên sự kiện
+    {
+        "input": "Gặp Lan 2 tuần nữa.",
+        "target": {
+            "event_name": "Gặp Lan",
+            "start_time": (now + timedelta(weeks=2)).strftime("%Y-%m-%d 09:00:00"),
+            "end_time": None,
+            "location": None,
+            "time_reminder": None
+        }
+    },
+    {
+        "input": "Họp lớp sau 3 tuần.",
+        "target": {
+            "event_name": "Họp lớp",
+            "start_time": (now + timedelta(weeks=3)).strftime("%Y-%m-%d 09:00:00"),
+            "end_time": None,
+            "location": None,
+            "time_reminder": None
+        }
+    },
+    {
+        "input": "gap lan khoang 2 tuan nua",
+        "target": {
+            "event_name": "Gặp Lan",
+            "start_time": (now + timedelta(weeks=2)).strftime("%Y-%m-%d 09:00:00"),
+            "end_time": None,
+            "location": None,
+            "time_reminder": None
+        }
+    },
+    # Gazetteer chỉ dùng sau tiền tố 'tại', 'ở'...: tên địa điểm đã biết không có tiền tố
+    # vẫn thuộc tên sự kiện
+    {
+        "input": "Đi Hà Nội ngày 20/11 lúc 7h.",
+        "target": {
+            "event_name": "Đi Hà Nội",
+            "start_time": next_date(11, 20).strftime("%Y-%m-%d 07:00:00"),
+            "end_time": None,
+            "location": None,
+            "time_reminder": None
+        }
+    },
+    {
+        "input": "Trả sách thư viện ngày 15 tháng 11.",
+        "target": {
+            "event_name": "Trả sách thư viện",
+            "start_time": next_date(11, 15).strftime("%Y-%m-%d 09:00:00"),
+            "end_time": None,
+            "location": None,
+            "time_reminder": None
+        }
+    },
+    {
+        "input": "hop o ha noi luc 9h ngay 20/11",
+        "target": {
+            "event_name": "Họp",
+            "start_time": next_date(11, 20).strftime("%Y-%m-%d 09:00:00"),
+            "end_time": None,
+            "location": "ha noi",
+            "time_reminder": None
+        }
+    },
+    # Từ khóa thời gian 'g' chỉ chặn location khi là trọn từ
+    {
+        "input": "tap gym luc 6h ngay 20/11 o phong gym california",
+        "target": {
+            "event_name": "Tap gym",
+            "start_time": next_date(11, 20).strftime("%Y-%m-%d 06:00:00"),
+            "end_time": None,
+            "location": "phòng gym california",
+            "time_reminder": None
+        }
+    },
+    # Location người dùng đã lưu ("user_locations") chỉ dùng khi parse văn bản của chính người đó
+    {
+        "input": "Mua đồ ở chợ mai lúc 7h ngày 20/11.",
+        "user_locations": ["chợ mai"],
+        "target": {
+            "event_name": "Mua đồ",
+            "start_time": next_date(11, 20).strftime("%Y-%m-%d 07:00:00"),
+            "end_time": None,
+            "location": "chợ mai",
+            "time_reminder": None
+        }
+    },
+    {
+        "input": "mua do o cho mai luc 7h ngay 20/11",
+        "user_locations": ["Chợ Mai"],
+        "target": {
+            "event_name": "Mua do",
+            "start_time": next_date(11, 20).strftime("%Y-%m-%d 07:00:00"),
+            "end_time": None,
+            "location": "cho mai",
+            "time_reminder": None
+        }
+    },
+    {
+        "input": "Mua đồ ở chợ mai lúc 7h ngày 20/11.",
+        "target": {
+            "event_name": "Mua đồ",
+            "start_time": next_date(11, 20).strftime("%Y-%m-%d 07:00:00"),
+            "end_time": None,
+            "location": "chợ",
+            "time_reminder": None
+        }
+    }
+]
+
+def _test_user(i, test_case):
+    # Test có "user_locations": học các location đó cho một người dùng giả riêng
+    # (id âm, không trùng người dùng thật) và trả về id đó để parse; không có thì None
+    if not test_case.get("user_locations"):
+        return None
+    GAZETTEER.learn_many((-i, location) for location in test_case["user_locations"])
+    return -i
+
 def run_nlp_tests():
     #Chạy test và tính độ chính xác của NLP processor
     p = NLPProcessor()
     correct_count = 0
-    total_count = len(testcases)
+    cases = testcases + regression_testcases
+    total_count = len(cases)
     
     print("BẮT ĐẦU KIỂM TRA NLP PROCESSOR")
     print("=" * 80)
     
-    for i, test_case in enumerate(testcases, 1):
+    for i, test_case in enumerate(cases, 1):
         input_text = test_case["input"]
         target = test_case["target"]
         
         print(f"Test {i:2d}: {input_text}")
         
         # Chạy NLP processor
-        result = p.process_text(input_text)
+        user_id = _test_user(i, test_case)
+        result = p.process_text(input_text, user_id=user_id)
         
         # Kiểm tra từng trường
         fields_correct = 0
@@ -414,5 +555,298 @@ def run_nlp_tests():
     
     return correct_count, total_count, accuracy
 
+def run_incremental_check():
+    # Parse khi gõ (NLPProcessor.preview) phải cho đúng kết quả như parse cả câu (process_text,
+    # không fallback vì preview không gọi dateparser) sau mỗi lần gõ: gõ từng ký tự, xóa vài ký tự
+    # cuối rồi gõ lại, và sửa ở giữa câu (gửi lại toàn bộ văn bản).
+    p = NLPProcessor(cache_size=0, fallback=False)
+    ref = datetime.now().replace(second=0, microsecond=0)
+    keystrokes = 0
+    mismatches = []
+    for i, test_case in enumerate(testcases + regression_testcases, 1):
+        text = test_case["input"]
+        user_id = _test_user(i, test_case)
+        session = ParseSession(f"check-{i}", user_id)
+        middle = len(text) // 2
+        steps = [(None, c, 0) for c in text]
+        steps += [(None, "", 3), (None, text[-3:], 0)]
+        steps.append((text[:middle] + " " + text[middle:], "", 0))
+        for full, append, delete in steps:
+            preview = p.preview(session, full, append, delete, now=ref)
+            expected = p.process_text(session.text, now=ref, user_id=user_id)
+            keystrokes += 1
+            diff = [f for f in ["event_name", "start_time", "end_time", "location", "time_reminder"]
+                    if preview.get(f) != expected.get(f)]
+            if diff:
+                mismatches.append((session.text, diff))
+
+    print(f"Parse khi gõ: {keystrokes} lần gõ, {len(mismatches)} lần khác với parse cả câu")
+    for text, diff in mismatches[:10]:
+        print(f"   {text!r}: {', '.join(diff)}")
+    return not mismatches
+
+# ==============================
+# Benchmark: tốc độ (parses/s, p50/p99) và độ chính xác trên corpus tổng hợp
+#   python scripts/run_nlp_test.py --bench [--size 5000] [--workers 4] [--output bench.json]
+#   python scripts/run_nlp_test.py --bench --update-baseline   # lưu kết quả làm baseline
+# Kết quả được so với baseline (mặc định scripts/nlp_bench_baseline.json); chậm hơn hoặc
+# kém chính xác hơn ngưỡng cho phép thì thoát với mã 1.
+# ==============================
+
+FIELDS = ["event_name", "start_time", "end_time", "location", "time_reminder"]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nlp_bench_baseline.json")
+
+# Các "khe" để ghép câu: (chuỗi, giá trị mong đợi)
+BENCH_TIMES = [
+    ("9h", (9, 0)), ("14:00", (14, 0)), ("7h30", (7, 30)), ("lúc 8 giờ", (8, 0)),
+    ("lúc 16h", (16, 0)), ("10 giờ sáng", (10, 0)), ("8h tối", (20, 0)), ("3 giờ chiều", (15, 0)),
+    ("lúc 9h sáng", (9, 0)), ("19h30", (19, 30)),
+]
+BENCH_REMINDERS = [
+    ("", None), ("", None), ("nhắc tôi trước 30 phút", 30), ("báo trước 2 tiếng", 120),
+    ("nhắc tôi 15 phút trước", 15), ("1 giờ trước", 60),
+]
+BENCH_PREFIXES = ["tại", "ở"]
+BENCH_ORDERS = [
+    "{event} {time} {date} {location} {reminder}",
+    "{event} {location} {time} {date} {reminder}",
+    "{event} {date} {time} {location} {reminder}",
+    "{event} {time} {date} {reminder}",
+]
+WEEKDAYS = [("thứ hai", 0), ("thứ ba", 1), ("thứ tư", 2), ("thứ năm", 3), ("thứ sáu", 4), ("thứ bảy", 5)]
+
+
+def _bench_date(rng, ref):
+    # Trả về (chuỗi ngày, date mong đợi) theo đúng quy ước của datetime_builder
+    kind = rng.randrange(4)
+    if kind == 0:
+        text, days = rng.choice([("ngày mai", 1), ("mai", 1), ("ngày kia", 2), ("ngày mốt", 2)])
+        return text, (ref + timedelta(days=days)).date()
+    if kind == 1:
+        text, weekday = rng.choice(WEEKDAYS)
+        days = (weekday - ref.weekday()) % 7 or 7
+        if rng.random() < 0.5:
+            text += " tuần sau"
+            if days < 7:
+                days += 7
+        return text, (ref + timedelta(days=days)).date()
+    # Ngày dạng số hoặc 'ngày D tháng M': ngày đã qua thì sang năm sau
+    while True:
+        day, month = rng.randint(1, 28), rng.randint(1, 12)
+        target = datetime(ref.year, month, day).date()
+        if target != ref.date():
+            break
+    if target < ref.date():
+        target = target.replace(year=ref.year + 1)
+    text = f"ngày {day}/{month}" if kind == 2 else f"ngày {day} tháng {month}"
+    return text, target
+
+
+def build_bench_corpus(size, seed=0, ref=None):
+    # Sinh corpus tổng hợp từ tên sự kiện / địa điểm của testcases, thay đổi ngày, giờ,
+    # địa điểm và nhắc nhở. Mỗi phần tử: {"input": ..., "target": {...}} như testcases.
+    ref = ref or datetime.now()
+    rng = random.Random(seed)
+    events = sorted({t["target"]["event_name"] for t in testcases})
+    locations = sorted({t["target"]["location"] for t in testcases if t["target"]["location"]})
+    corpus = []
+    for _ in range(size):
+        event = rng.choice(events)
+        time_text, (hour, minute) = rng.choice(BENCH_TIMES)
+        date_text, date_value = _bench_date(rng, ref)
+        reminder_text, reminder = rng.choice(BENCH_REMINDERS)
+        order = rng.choice(BENCH_ORDERS)
+        location = rng.choice(locations) if "{location}" in order else None
+        text = order.format(
+            event=event,
+            time=time_text,
+            date=date_text,
+            location=f"{rng.choice(BENCH_PREFIXES)} {location}" if location else "",
+            reminder=reminder_text,
+        )
+        corpus.append({
+            "input": re.sub(r"\s+", " ", text).strip(),
+            "target": {
+                "event_name": event,
+                "start_time": datetime.combine(date_value, datetime.min.time()).replace(hour=hour, minute=minute).strftime("%Y-%m-%d %H:%M:%S"),
+                "end_time": None,
+                "location": location,
+                "time_reminder": reminder,
+            },
+        })
+    return corpus
+
+
+def _latency_stats(latencies, wall):
+    ordered = sorted(latencies)
+
+    def pct(q):
+        return ordered[min(len(ordered), max(1, math.ceil(q * len(ordered)))) - 1] * 1000
+
+    return {
+        "count": len(ordered),
+        "wall_s": round(wall, 4),
+        "parses_per_sec": round(len(ordered) / wall, 1) if wall else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4),
+        "p50_ms": round(pct(0.50), 4),
+        "p99_ms": round(pct(0.99), 4),
+    }
+
+
+_bench_processor = None
+_bench_now = None
+
+
+def _bench_init(cache_size, now=None):
+    global _bench_processor, _bench_now
+    _bench_processor = NLPProcessor(cache_size=cache_size)
+    _bench_now = now
+
+
+def _bench_chunk(texts):
+    # Chạy trong worker process: trả về (kết quả, độ trễ từng câu)
+    results, latencies = [], []
+    for text in texts:
+        started = time.perf_counter()
+        results.append(_bench_processor.process_text(text, now=_bench_now))
+        latencies.append(time.perf_counter() - started)
+    return results, latencies
+
+
+def _bench_accuracy(corpus, results):
+    exact = 0
+    field_hits = dict.fromkeys(FIELDS, 0)
+    for item, result in zip(corpus, results):
+        ok = True
+        for field in FIELDS:
+            if check_match(result.get(field), item["target"][field]):
+                field_hits[field] += 1
+            else:
+                ok = False
+        exact += ok
+    total = len(corpus)
+    return {
+        "exact": round(exact / total * 100, 2),
+        "fields": {field: round(hits / total * 100, 2) for field, hits in field_hits.items()},
+    }
+
+
+def run_nlp_bench(size=5000, seed=0, workers=None, cache=False):
+    cache_size = None if cache else 0
+    # Corpus và mọi lần parse dùng chung một thời điểm tham chiếu để kết quả ổn định
+    ref = datetime.now().replace(second=0, microsecond=0)
+    corpus = build_bench_corpus(size, seed, ref)
+    texts = [item["input"] for item in corpus]
+
+    # Độ chính xác trên testcases viết tay (ẩn phần in chi tiết)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, _, testcase_accuracy = run_nlp_tests()
+
+    # Một process: đo từng câu sau khi chạy nóng
+    _bench_init(cache_size, ref)
+    _bench_chunk(texts[:200])
+    started = time.perf_counter()
+    results, latencies = _bench_chunk(texts)
+    single = _latency_stats(latencies, time.perf_counter() - started)
+
+    # Nhiều process: chia corpus thành các phần, thông lượng tính theo thời gian thực
+    workers = workers or os.cpu_count() or 1
+    chunk = max(1, math.ceil(len(texts) / (workers * 8)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_bench_init, initargs=(cache_size, ref)) as pool:
+        list(pool.map(_bench_chunk, [texts[:50]] * workers))
+        started = time.perf_counter()
+        parts = list(pool.map(_bench_chunk, [texts[i:i + chunk] for i in range(0, len(texts), chunk)]))
+        wall = time.perf_counter() - started
+    multi = _latency_stats([lat for _, lats in parts for lat in lats], wall)
+    multi["workers"] = workers
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "size": size,
+            "seed": seed,
+            "cache": cache,
+        },
+        "accuracy": {
+            "testcases": round(testcase_accuracy, 2),
+            "synthetic": _bench_accuracy(corpus, results),
+        },
+        "single": single,
+        "multi": multi,
+    }
+
+
+def compare_bench(current, baseline, max_slowdown=0.10):
+    # Trả về danh sách các hồi quy so với baseline (rỗng = đạt)
+    regressions = []
+    rows = [
+        ("single.parses_per_sec", current["single"]["parses_per_sec"], baseline["single"]["parses_per_sec"], True),
+        ("single.p99_ms", current["single"]["p99_ms"], baseline["single"]["p99_ms"], False),
+        ("multi.parses_per_sec", current["multi"]["parses_per_sec"], baseline["multi"]["parses_per_sec"], True),
+        ("accuracy.testcases", current["accuracy"]["testcases"], baseline["accuracy"]["testcases"], True),
+        ("accuracy.synthetic", current["accuracy"]["synthetic"]["exact"], baseline["accuracy"]["synthetic"]["exact"], True),
+    ]
+    print(f"{'metric':<24}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, cur, base, higher_is_better in rows:
+        change = (cur - base) / base * 100 if base else 0.0
+        print(f"{name:<24}{base:>12}{cur:>12}{change:>9.1f}%")
+        if name.startswith("accuracy"):
+            # Độ chính xác không được giảm
+            if cur < base:
+                regressions.append(f"{name}: {base} -> {cur}")
+        elif higher_is_better and cur < base * (1 - max_slowdown):
+            regressions.append(f"{name}: {base} -> {cur}")
+        elif not higher_is_better and cur > base * (1 + max_slowdown):
+            regressions.append(f"{name}: {base} -> {cur}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra độ chính xác và benchmark NLP processor")
+    parser.add_argument("--bench", action="store_true", help="chạy benchmark thay vì in kết quả từng test")
+    parser.add_argument("--size", type=int, default=5000, help="số câu trong corpus tổng hợp")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="số process cho phần đo nhiều process")
+    parser.add_argument("--cache", action="store_true", help="bật cache kết quả của NLPProcessor khi đo")
+    parser.add_argument("--output", help="ghi kết quả ra file JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="file JSON baseline để so sánh")
+    parser.add_argument("--update-baseline", action="store_true", help="ghi kết quả lần chạy này làm baseline")
+    parser.add_argument("--max-slowdown", type=float, default=0.10, help="mức chậm đi tối đa cho phép (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    if not args.bench:
+        run_nlp_tests()
+        return 0 if run_incremental_check() else 1
+
+    report = run_nlp_bench(args.size, args.seed, args.workers, args.cache)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Đã lưu baseline: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Chưa có baseline ({args.baseline}); chạy lại với --update-baseline để tạo")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_bench(report, baseline, args.max_slowdown)
+    if regressions:
+        print("HỒI QUY so với baseline:")
+        for line in regressions:
+            print(f"   {line}")
+        return 1
+    print("Không có hồi quy so với baseline")
+    return 0
+
+
 if __name__ == "__main__":
-    run_nlp_tests()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -1,7 +1,8 @@
-import React, { useEffect, useMemo, useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { eventsAPI } from '../../services/api';
+import { getCurrentUser } from '../../services/auth';
 
-// SearchBar: tìm theo event_name hoặc location (substring, case-insensitive)
+// SearchBar: tìm sự kiện của user theo event_name hoặc location (phía server, không phân biệt dấu)
 // - Khi chọn 1 result: emit CustomEvent 'event:selected' với detail { event, isMobile }
 
 export default function SearchBar({ maxResults = 5 }) {
@@ -9,37 +10,21 @@ export default function SearchBar({ maxResults = 5 }) {
   const [results, setResults] = useState([]);
   const [open, setOpen] = useState(false);
 
-  // simple normalize
-  const norm = (s = '') => (s || '').toString().toLowerCase();
-
   useEffect(() => {
     let mounted = true;
     const load = async () => {
-      if (!q || q.trim().length === 0) {
+      const user = getCurrentUser();
+      if (!q || q.trim().length === 0 || !user) {
         setResults([]);
         return;
       }
       try {
-        const r = await eventsAPI.getEvents();
-        const list = Array.isArray(r.data) ? r.data : (r.data.events || []);
-        const qn = norm(q).trim();
-        const filtered = (list || [])
-          .filter(ev => {
-            const name = norm(ev.event_name || '');
-            const loc = norm(ev.location || '');
-            return name.includes(qn) || loc.includes(qn);
-          })
-          // Sort newest-first (reverse chronological) so most recent events appear first
-          .sort((a,b) => {
-            const ta = a.start_time ? new Date(a.start_time).getTime() : 0;
-            const tb = b.start_time ? new Date(b.start_time).getTime() : 0;
-            return tb - ta;
-          })
-          .slice(0, maxResults);
-        if (mounted) setResults(filtered);
+        // Server đã lọc, sắp mới nhất trước và giới hạn số kết quả
+        const r = await eventsAPI.searchEvents(user.id, q.trim(), maxResults);
+        if (mounted) setResults(r.data?.events || []);
       } catch (e) {
         console.error('Search error', e);
-        setResults([]);
+        if (mounted) setResults([]);
       }
     };
 
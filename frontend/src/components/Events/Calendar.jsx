@@ -1,7 +1,7 @@
 import React, { useState, useMemo,useEffect } from 'react';
 
 // Lịch tháng đơn giản, hiển thị số sự kiện mỗi ngày.
-const Calendar = ({ events = [], selectedDate, onSelectDate, onEditEvent, onDeleteEvent, onCreateEvent, externalModalDate, onCloseExternalModal, onRequestDelete }) => {
+const Calendar = ({ events = [], selectedDate, onSelectDate, onEditEvent, onDeleteEvent, onCreateEvent, externalModalDate, onCloseExternalModal, onRequestDelete, onMonthChange }) => {
   const dateKeyVN = (d) => {
     if (!d) return null;
     const dateObj = (typeof d === 'string') ? new Date(d) : d;
@@ -23,6 +23,20 @@ const Calendar = ({ events = [], selectedDate, onSelectDate, onEditEvent, onDele
   });
   const [modalDate, setModalDate] = useState(null);
 
+  // Báo tháng đang hiển thị để parent chỉ tải sự kiện của tháng đó
+  useEffect(() => {
+    if (onMonthChange) onMonthChange(current);
+  }, [current]);
+
+  // Ngày được chọn ở tháng khác (vd. chọn từ ô tìm kiếm): chuyển lịch sang tháng đó
+  useEffect(() => {
+    if (!selectedDate) return;
+    const d = new Date(selectedDate);
+    if (d.getFullYear() !== current.getFullYear() || d.getMonth() !== current.getMonth()) {
+      setCurrent(new Date(d.getFullYear(), d.getMonth(), 1));
+    }
+  }, [selectedDate]);
+
   // If parent requests the calendar modal for a specific date (e.g., search on mobile), show it
   useEffect(() => {
     try {
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { eventsAPI } from '../../services/api';
 import { useToast } from '../Common/ToastProvider';
 import EventItem from './EventItem';
@@ -22,11 +22,32 @@ const EventList = () => {
 
   const [deleteCandidate, setDeleteCandidate] = useState(null);
 
+  // Tháng đang hiển thị trên lịch ('YYYY-MM', theo giờ VN); chỉ tải sự kiện của tháng này
+  const [month, setMonth] = useState(() => new Date().toLocaleDateString('en-CA', { timeZone: 'Asia/Ho_Chi_Minh' }).slice(0, 7));
+
+  const monthRange = (key) => {
+    const [y, m] = key.split('-').map(Number);
+    const next = m === 12 ? `${y + 1}-01` : `${y}-${String(m + 1).padStart(2, '0')}`;
+    return { from: `${key}-01T00:00:00`, to: `${next}-01T00:00:00` };
+  };
+
+  // Sự kiện giao với tháng đang xem (cùng điều kiện với from/to ở server)
+  const inMonth = (ev, key) => {
+    const { from, to } = monthRange(key);
+    return ev.start_time < to && (ev.start_time >= from || (ev.end_time != null && ev.end_time > from));
+  };
+
+  // Cursor đồng bộ delta: sau khi tạo/sửa/xóa chỉ tải các thay đổi thay vì tải lại cả tháng
+  const syncCursor = useRef(null);
+
   const fetchEvents = async () => {
     try {
       // If user is logged in, fetch their events; otherwise fetch public events
       const user = getCurrentUser();
-      const response = await eventsAPI.getEventsByUser(user.id);
+      // Lấy cursor trước khi tải: thay đổi xảy ra trong lúc tải sẽ được lần đồng bộ sau nhận
+      const head = await eventsAPI.getChanges(user.id);
+      syncCursor.current = head.data?.cursor ?? null;
+      const response = await eventsAPI.getEventsByUser(user.id, monthRange(month));
       const data = response?.data ?? {};
       const list = Array.isArray(data) ? data : (data.events ?? []);
       setEvents(Array.isArray(list) ? list : []);
@@ -40,9 +61,37 @@ const EventList = () => {
     }
   };
 
+  const syncEvents = async () => {
+    if (syncCursor.current == null) return fetchEvents();
+    try {
+      const user = getCurrentUser();
+      const changed = new Map();
+      const deleted = new Set();
+      let cursor = syncCursor.current;
+      let more = true;
+      while (more) {
+        const { data } = await eventsAPI.getChanges(user.id, cursor);
+        data.deleted.forEach((id) => { deleted.add(id); changed.delete(id); });
+        data.events.forEach((ev) => { changed.set(ev.id, ev); deleted.delete(ev.id); });
+        cursor = data.cursor;
+        more = data.has_more;
+      }
+      syncCursor.current = cursor;
+      setEvents((prev) => {
+        const next = prev.filter((ev) => !deleted.has(ev.id) && !changed.has(ev.id));
+        changed.forEach((ev) => { if (inMonth(ev, month)) next.push(ev); });
+        return next.sort((a, b) => (a.start_time === b.start_time ? a.id - b.id : (a.start_time < b.start_time ? -1 : 1)));
+      });
+    } catch (error) {
+      // Cursor không còn hợp lệ (vd. database được tạo lại): tải lại cả tháng
+      console.log(error);
+      fetchEvents();
+    }
+  };
+
   useEffect(() => {
     fetchEvents();
-  }, []);
+  }, [month]);
 
 
   // Listen for global selection events from SearchBar
@@ -94,7 +143,7 @@ const EventList = () => {
     if (!deleteCandidate) return;
     try {
       await eventsAPI.deleteEvent(deleteCandidate.id);
-      fetchEvents();
+      syncEvents();
       try { toast.showToast({ type: 'success', message: 'Xóa lịch trình thành công' }); } catch (e) {}
     } catch (error) {
       setError('Không thể xóa lịch trình');
@@ -110,7 +159,7 @@ const EventList = () => {
   };
 
   const handleEventCreated = () => {
-    fetchEvents();
+    syncEvents();
     setShowForm(false);
   };
 
@@ -143,6 +192,7 @@ const EventList = () => {
             onRequestDelete={(id, name) => setDeleteCandidate({ id, name })}
             externalModalDate={calendarModalDate}
             onCloseExternalModal={() => setCalendarModalDate(null)}
+            onMonthChange={(d) => setMonth(`${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, '0')}`)}
           />
         </div>
 
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { nlpAPI, eventsAPI } from '../../services/api';
 import { getCurrentUser } from '../../services/auth';
 import { useToast } from '../Common/ToastProvider';
@@ -9,8 +9,56 @@ const NLPInput = ({ onEventCreated }) => {
   const [formData, setFormData] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  const [preview, setPreview] = useState(null);
+  // Phiên parse khi đang gõ: chỉ gửi phần thay đổi ở cuối so với lần gửi trước
+  const sessionRef = useRef(null);
+  const sentTextRef = useRef('');
   const { showToast } = useToast();
 
+  const endPreviewSession = () => {
+    const session = sessionRef.current;
+    sessionRef.current = null;
+    sentTextRef.current = '';
+    setPreview(null);
+    if (session) nlpAPI.endIncremental(session).catch(() => {});
+  };
+
+  useEffect(() => {
+    if (!text.trim()) {
+      endPreviewSession();
+      return;
+    }
+    const timer = setTimeout(async () => {
+      const sent = sentTextRef.current;
+      let payload;
+      if (sessionRef.current && text.startsWith(sent)) {
+        payload = { session: sessionRef.current, append: text.slice(sent.length) };
+      } else if (sessionRef.current && sent.startsWith(text)) {
+        payload = { session: sessionRef.current, delete: sent.length - text.length };
+      } else {
+        payload = { session: sessionRef.current, text, user_id: getCurrentUser()?.id ?? null };
+      }
+      try {
+        let response;
+        try {
+          response = await nlpAPI.parseIncremental(payload);
+        } catch (err) {
+          // Phiên hết hạn: mở phiên mới với toàn bộ văn bản
+          if (err.response?.status !== 404) throw err;
+          response = await nlpAPI.parseIncremental({ text, user_id: getCurrentUser()?.id ?? null });
+        }
+        sessionRef.current = response.data.session;
+        sentTextRef.current = text;
+        setPreview(response.data.start_time ? response.data : null);
+      } catch (e) {
+        setPreview(null);
+      }
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [text]);
+
+  useEffect(() => () => endPreviewSession(), []);
+
   const handleParseText = async () => {
     if (!text.trim()) return;
 
@@ -30,7 +78,7 @@ const NLPInput = ({ onEventCreated }) => {
     setLoading(true);
     
     try {
-      const response = await nlpAPI.parseText(text);
+      const response = await nlpAPI.parseText(text, getCurrentUser()?.id);
       const data = response.data || {};
 
       if (!data.start_time) {
@@ -97,6 +145,7 @@ const NLPInput = ({ onEventCreated }) => {
       };
 
       await eventsAPI.createEvent(submitData);
+      endPreviewSession();
       setText('');
       setParsedEvent(null);
       setFormData(null);
@@ -148,6 +197,13 @@ const NLPInput = ({ onEventCreated }) => {
         </button>
       </div>
 
+      {preview && !parsedEvent && (
+        <div className="nlp-preview">
+          Xem trước: {preview.event_name} · {formatDateTime(preview.start_time)}
+          {preview.location ? ` · ${preview.location}` : ''}
+        </div>
+      )}
+
       {parsedEvent && formData && (
         <div className="parsed-event">
           <h4>Thông tin lịch trình đã phân tích (chỉnh sửa nếu cần):</h4>
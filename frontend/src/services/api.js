@@ -49,9 +49,26 @@ export const authAPI = {
   getProfile: () => api.get('/users/me'),
 }
 
+// Danh sách sự kiện được trả theo trang ({ events, next_cursor }); gọi tiếp với
+// cursor = next_cursor cho tới khi hết, trả về { data: { events } } như một response
+const getAllPages = async (url, params = {}) => {
+  const events = []
+  let cursor = null
+  do {
+    const response = await api.get(url, { params: { ...params, limit: 500, ...(cursor ? { cursor } : {}) } })
+    events.push(...(response.data?.events ?? []))
+    cursor = response.data?.next_cursor
+  } while (cursor)
+  return { data: { events } }
+}
+
 export const eventsAPI = {
-  getEvents: () => api.get('/events'),
-  getEventsByUser: (userId) => api.get(`/events/user/${userId}`),
+  // range (tùy chọn): { from, to } — chỉ lấy sự kiện giao với khoảng [from, to)
+  getEventsByUser: (userId, range = {}) => getAllPages(`/events/user/${userId}`, range),
+  // Tìm theo tên/địa điểm phía server (không phân biệt dấu, khớp tiền tố), mới nhất trước
+  searchEvents: (userId, q, limit) => api.get(`/events/user/${userId}/search`, { params: { q, limit } }),
+  // Đồng bộ delta: { events, deleted, cursor, has_more } sau cursor `since`; không có since: chỉ lấy cursor hiện tại
+  getChanges: (userId, since) => api.get(`/events/user/${userId}/changes`, { params: since == null ? {} : { since } }),
   getEvent: (id) => api.get(`/events/${id}`),
   createEvent: (eventData) => api.post('/events', eventData),
   updateEvent: (id, eventData) => api.put(`/events/${id}`, eventData),
@@ -59,7 +76,11 @@ export const eventsAPI = {
 }
 
 export const nlpAPI = {
-  parseText: (text) => api.post('/nlp/parse', { text }),
+  // userId: dùng thêm các địa điểm người dùng đã lưu khi trích xuất location
+  parseText: (text, userId) => api.post('/nlp/parse', { text, user_id: userId ?? null }),
+  // Parse khi đang gõ: { session, append, delete } hoặc { session, text } (kèm user_id khi mở phiên)
+  parseIncremental: (payload) => api.post('/nlp/parse/incremental', payload),
+  endIncremental: (session) => api.delete(`/nlp/parse/incremental/${session}`),
 }
 
 export default api
\ No newline at end of file